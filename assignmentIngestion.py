@@ -0,0 +1,333 @@
+import azure.functions as func
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+
+from clientPool import get_blob_service_client, get_search_client, sql_connection
+from embeddingCache import embedding_options, EMBEDDING_DIMENSIONS
+from getAssignmentDetails import invalidate_assignments
+from jobQueue import submit_job, wants_background_job, job_accepted_response
+from llmGateway import create_embeddings
+from localVectorIndex import get_local_vector_index
+from promptBuilder import split_to_token_windows, PROMPT_TOKEN_ENCODING
+from singleFlight import SingleFlight
+from telemetry import instrument_route, span, traced, record_usage, bind
+
+assignmentIngestion = func.Blueprint()
+
+# Keeps the search index behind assignmentsMatch in step with dbo.assignmentList.
+# Rows are read in keyset pages and hashed; a manifest blob holds the hash and chunk
+# count last indexed per assignment, so only new or changed rows are chunked, embedded
+# and uploaded, and chunks of shortened or deleted assignments are removed.
+
+# Opt-in: the index may be filled by another system, and this run rewrites and deletes its documents
+ASSIGNMENT_INGESTION_ENABLED = os.getenv("ASSIGNMENT_INGESTION_ENABLED", "false").lower() == "true"
+ASSIGNMENT_INGESTION_SCHEDULE = os.getenv("ASSIGNMENT_INGESTION_SCHEDULE", "0 */30 * * * *")
+ASSIGNMENT_INGESTION_PAGE_SIZE = int(os.getenv("ASSIGNMENT_INGESTION_PAGE_SIZE", "500"))
+
+ASSIGNMENT_CHUNK_MAX_TOKENS = int(os.getenv("ASSIGNMENT_CHUNK_MAX_TOKENS", "512"))
+ASSIGNMENT_CHUNK_OVERLAP_TOKENS = int(os.getenv("ASSIGNMENT_CHUNK_OVERLAP_TOKENS", "64"))
+
+# Inputs per embeddings call (the API takes up to 2048), and calls in flight
+ASSIGNMENT_EMBED_BATCH_SIZE = int(os.getenv("ASSIGNMENT_EMBED_BATCH_SIZE", "256"))
+ASSIGNMENT_EMBED_CONCURRENCY = int(os.getenv("ASSIGNMENT_EMBED_CONCURRENCY", "4"))
+
+# Index batches are capped at 1000 documents / 16 MB; a chunk with its vector is ~15-30 KB
+ASSIGNMENT_UPLOAD_BATCH_SIZE = int(os.getenv("ASSIGNMENT_UPLOAD_BATCH_SIZE", "250"))
+
+MANIFEST_CONTAINER_NAME = "gtfydemo"
+MANIFEST_BLOB_NAME = "manifests/assignment_index.json"
+
+# Bump when the document layout changes so every assignment is re-indexed
+INGESTION_VERSION = "1"
+
+INDEXED_COLUMNS = ["id", "title", "company", "location", "type", "job_desc", "req_skills", "key_responsibilities"]
+
+_ingestion_flights = SingleFlight()
+
+
+def _index_fingerprint():
+    # Anything that changes the stored chunks or vectors invalidates every row hash
+    return "|".join(str(part) for part in (
+        INGESTION_VERSION,
+        os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+        EMBEDDING_DIMENSIONS,
+        PROMPT_TOKEN_ENCODING,
+        ASSIGNMENT_CHUNK_MAX_TOKENS,
+        ASSIGNMENT_CHUNK_OVERLAP_TOKENS
+    ))
+
+
+def assignment_hash(row, fingerprint) -> str:
+    payload = json.dumps({column: row.get(column) for column in INDEXED_COLUMNS}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{fingerprint}\0{payload}".encode("utf-8")).hexdigest()
+
+
+def build_documents(row) -> list:
+    # One search document per description chunk, keyed {gtd_id}_{i}
+    gtd_id = str(row["id"])
+    chunks = split_to_token_windows(row.get("job_desc") or "", ASSIGNMENT_CHUNK_MAX_TOKENS, ASSIGNMENT_CHUNK_OVERLAP_TOKENS)
+
+    return [
+        {
+            "id": f"{gtd_id}_{i}",
+            "gtd_id": gtd_id,
+            "title": row.get("title"),
+            "company": row.get("company"),
+            "location": row.get("location"),
+            "type": row.get("type"),
+            "req_skills": row.get("req_skills"),
+            "key_responsibilities": row.get("key_responsibilities"),
+            "job_desc": chunk
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def _embedding_input(document) -> str:
+    # Title and skills go with every chunk, they carry most of the match signal
+    return "\n".join(part for part in (document["title"], document["req_skills"], document["job_desc"]) if part)
+
+
+def iter_assignment_pages(page_size=ASSIGNMENT_INGESTION_PAGE_SIZE):
+    # Keyset pagination; the pooled connection is returned between pages
+    last_id = None
+    while True:
+        with span("sql.assignments"), sql_connection() as conn:
+            cursor = conn.cursor()
+            columns_sql = ", ".join(INDEXED_COLUMNS)
+            if last_id is None:
+                cursor.execute(f"SELECT TOP (?) {columns_sql} FROM dbo.assignmentList ORDER BY id", page_size)
+            else:
+                cursor.execute(f"SELECT TOP (?) {columns_sql} FROM dbo.assignmentList WHERE id > ? ORDER BY id", page_size, last_id)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def count_assignments() -> int:
+    with span("sql.assignments"), sql_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM dbo.assignmentList")
+        return cursor.fetchone()[0]
+
+
+def _embed_batch(texts) -> list:
+    with span("llm.embed"):
+        response = create_embeddings(texts, **embedding_options())
+    record_usage(response.usage, "embeddings")
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+@traced("ingest.embed")
+def embed_documents(documents):
+    texts = [_embedding_input(document) for document in documents]
+    batches = [texts[i:i + ASSIGNMENT_EMBED_BATCH_SIZE] for i in range(0, len(texts), ASSIGNMENT_EMBED_BATCH_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=max(min(len(batches), ASSIGNMENT_EMBED_CONCURRENCY), 1)) as executor:
+        vectors = [vector for batch in executor.map(bind(_embed_batch), batches) for vector in batch]
+
+    for document, vector in zip(documents, vectors):
+        document["embedding"] = vector
+
+
+@traced("ingest.upload")
+def upload_documents(search_client, documents) -> set:
+    # Returns the keys the index rejected
+    failed = set()
+    for i in range(0, len(documents), ASSIGNMENT_UPLOAD_BATCH_SIZE):
+        results = search_client.merge_or_upload_documents(documents=documents[i:i + ASSIGNMENT_UPLOAD_BATCH_SIZE])
+        for result in results:
+            if not result.succeeded:
+                logging.warning(f"Indexing {result.key} failed ({result.status_code}): {result.error_message}")
+                failed.add(result.key)
+    return failed
+
+
+@traced("ingest.delete")
+def delete_documents(search_client, keys) -> set:
+    # Returns the keys the index failed to delete
+    failed = set()
+    for i in range(0, len(keys), ASSIGNMENT_UPLOAD_BATCH_SIZE):
+        results = search_client.delete_documents(documents=[{"id": key} for key in keys[i:i + ASSIGNMENT_UPLOAD_BATCH_SIZE]])
+        for result in results:
+            if not result.succeeded:
+                logging.warning(f"Deleting {result.key} failed ({result.status_code}): {result.error_message}")
+                failed.add(result.key)
+    return failed
+
+
+def _manifest_from_index(search_client) -> dict:
+    # First run against an index filled elsewhere: record the chunk counts already
+    # there (without hashes) so everything is re-indexed and leftover chunks are deleted
+    manifest = {}
+    for doc in search_client.search(search_text="*", select=["id", "gtd_id"]):
+        gtd_id, _, chunk = doc["id"].rpartition("_")
+        if gtd_id and chunk.isdigit():
+            previous = manifest.get(gtd_id, [None, 0])[1]
+            manifest[gtd_id] = [None, max(previous, int(chunk) + 1)]
+    logging.info(f"No ingestion manifest; found {len(manifest)} assignments in the index.")
+    return manifest
+
+
+def load_manifest(blob_service, search_client):
+    blob_client = blob_service.get_blob_client(container=MANIFEST_CONTAINER_NAME, blob=MANIFEST_BLOB_NAME)
+    try:
+        downloader = blob_client.download_blob()
+    except ResourceNotFoundError:
+        return _manifest_from_index(search_client), None
+    return json.loads(downloader.readall()), downloader.properties.etag
+
+
+def save_manifest(blob_service, manifest, etag):
+    # Conditional write, so a concurrent run on another instance fails instead of
+    # silently overwriting this one's progress (or the other way round)
+    from azure.storage.blob import ContentSettings
+
+    blob_client = blob_service.get_blob_client(container=MANIFEST_CONTAINER_NAME, blob=MANIFEST_BLOB_NAME)
+    conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+    result = blob_client.upload_blob(
+        json.dumps(manifest, separators=(",", ":")),
+        overwrite=etag is not None,
+        content_settings=ContentSettings(content_type="application/json"),
+        **conditions
+    )
+    return result["etag"]
+
+
+def ingest_assignments(full=False) -> dict:
+    blob_service = get_blob_service_client()
+    search_client = get_search_client()
+    fingerprint = _index_fingerprint()
+
+    manifest, etag = load_manifest(blob_service, search_client)
+    seen = set()
+    stats = {"rows": 0, "unchanged": 0, "indexed": 0, "failed": 0, "removed": 0, "chunks_uploaded": 0, "chunks_deleted": 0}
+
+    for page in iter_assignment_pages():
+        stats["rows"] += len(page)
+        changed = []
+        for row in page:
+            gtd_id = str(row["id"])
+            seen.add(gtd_id)
+            content_hash = assignment_hash(row, fingerprint)
+            if not full and manifest.get(gtd_id, [None])[0] == content_hash:
+                stats["unchanged"] += 1
+                continue
+            changed.append((gtd_id, content_hash, build_documents(row)))
+
+        if not changed:
+            continue
+
+        documents = [document for _, _, row_documents in changed for document in row_documents]
+        embed_documents(documents)
+        failed = upload_documents(search_client, documents)
+        stats["chunks_uploaded"] += len(documents) - len(failed)
+
+        indexed = []
+        for gtd_id, content_hash, row_documents in changed:
+            if any(document["id"] in failed for document in row_documents):
+                # Left out of the manifest, so the next run retries it
+                stats["failed"] += 1
+                continue
+            previous_chunks = manifest.get(gtd_id, [None, 0])[1]
+            indexed.append((gtd_id, content_hash, len(row_documents), previous_chunks))
+
+        stale = [f"{gtd_id}_{i}" for gtd_id, _, chunks, previous_chunks in indexed for i in range(chunks, previous_chunks)]
+        delete_failed = delete_documents(search_client, stale) if stale else set()
+        stats["chunks_deleted"] += len(stale) - len(delete_failed)
+
+        for gtd_id, content_hash, chunks, previous_chunks in indexed:
+            if any(f"{gtd_id}_{i}" in delete_failed for i in range(chunks, previous_chunks)):
+                # No hash, so the next run re-indexes the row and retries the leftover chunks
+                manifest[gtd_id] = [None, previous_chunks]
+                stats["failed"] += 1
+                continue
+            manifest[gtd_id] = [content_hash, chunks]
+            stats["indexed"] += 1
+
+        invalidate_assignments([gtd_id for gtd_id, _, _ in changed])
+
+        # Saved per page so a run that times out keeps what it has indexed
+        etag = save_manifest(blob_service, manifest, etag)
+
+    removed = [gtd_id for gtd_id in manifest if gtd_id not in seen]
+    if removed and not seen:
+        # An empty read is far more likely a broken source than an emptied catalog
+        logging.warning(f"dbo.assignmentList returned no rows; keeping {len(removed)} indexed assignments.")
+    elif removed and count_assignments() != len(seen):
+        # Rows added or removed while paging: the read may be incomplete, so nothing is removed this run
+        logging.warning(f"dbo.assignmentList changed during the read; keeping {len(removed)} indexed assignments until the next run.")
+    elif removed:
+        stale = [f"{gtd_id}_{i}" for gtd_id in removed for i in range(manifest[gtd_id][1])]
+        delete_failed = delete_documents(search_client, stale)
+        for gtd_id in removed:
+            if any(f"{gtd_id}_{i}" in delete_failed for i in range(manifest[gtd_id][1])):
+                # Kept in the manifest, so the next run retries the removal
+                stats["failed"] += 1
+                continue
+            del manifest[gtd_id]
+            stats["removed"] += 1
+        stats["chunks_deleted"] += len(stale) - len(delete_failed)
+        etag = save_manifest(blob_service, manifest, etag)
+
+    if stats["indexed"] or stats["removed"]:
+        get_local_vector_index().refresh_soon()
+
+    logging.info(f"Assignment ingestion finished: {json.dumps(stats)}")
+    return stats
+
+
+def run_assignment_ingestion(job):
+    if not ASSIGNMENT_INGESTION_ENABLED:
+        raise RuntimeError("Assignment ingestion is disabled; set ASSIGNMENT_INGESTION_ENABLED=true to enable it.")
+
+    full = str(job.get("full", "")).lower() == "true"
+    # A timer run and a manual run on the same worker share one pass
+    return _ingestion_flights.do(f"ingest:{full}", lambda: ingest_assignments(full=full))
+
+
+@assignmentIngestion.timer_trigger(schedule=ASSIGNMENT_INGESTION_SCHEDULE, arg_name="timer", run_on_startup=False)
+def ingestAssignmentsOnSchedule(timer: func.TimerRequest) -> None:
+    if not ASSIGNMENT_INGESTION_ENABLED:
+        return
+    if timer.past_due:
+        logging.info("Assignment ingestion timer is past due.")
+
+    run_assignment_ingestion({})
+
+
+@assignmentIngestion.route(route="ingestAssignments", methods=["POST"])
+@instrument_route("ingestAssignments")
+def ingestAssignments(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Processing assignment ingestion request.')
+
+    if not ASSIGNMENT_INGESTION_ENABLED:
+        return func.HttpResponse("Assignment ingestion is disabled; set ASSIGNMENT_INGESTION_ENABLED=true to enable it.", status_code=403)
+
+    try:
+        job = {"full": req.params.get("full", "false")}
+
+        # A full re-index of a large catalog can outlast the HTTP timeout
+        if wants_background_job(req):
+            return job_accepted_response(submit_job("ingestAssignments", job))
+
+        return func.HttpResponse(
+            json.dumps(run_assignment_ingestion(job)),
+            mimetype="application/json",
+            status_code=200
+        )
+
+    except Exception as e:
+        logging.error(f"Error: {str(e)}")
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
@@ -0,0 +1,465 @@
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError, ResourceNotModifiedError
+
+# In-process stand-ins for Blob Storage, Azure OpenAI, Cognitive Search and Azure SQL.
+# They implement only the calls the handlers make, and every call sleeps for the
+# configured latency so results resemble a deployed function rather than pure CPU time.
+EMBEDDING_DIM = 1536
+
+
+class Latency:
+    def __init__(self, mean_ms=0.0, jitter_ms=0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    @classmethod
+    def parse(cls, spec):
+        # "400" or "400:50" (mean:jitter, milliseconds)
+        mean, _, jitter = spec.partition(":")
+        return cls(float(mean), float(jitter or 0))
+
+    def sleep(self):
+        if self.mean_ms <= 0 and self.jitter_ms <= 0:
+            return
+        delay_ms = max(random.gauss(self.mean_ms, self.jitter_ms) if self.jitter_ms else self.mean_ms, 0.0)
+        time.sleep(delay_ms / 1000)
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# Blob Storage
+
+class _StoredBlob:
+    def __init__(self, data, content_type=None):
+        self.data = data
+        self.content_type = content_type
+        self.etag = f'"{uuid.uuid4().hex}"'
+        self.last_modified = datetime.now(timezone.utc)
+
+
+class _BlobItem(SimpleNamespace):
+    pass
+
+
+class _Downloader:
+    def __init__(self, blob):
+        self._data = blob.data
+        self.properties = SimpleNamespace(etag=blob.etag, last_modified=blob.last_modified, size=len(blob.data))
+
+    def readall(self):
+        return self._data
+
+    def readinto(self, stream):
+        stream.write(self._data)
+        return len(self._data)
+
+
+class _Pages:
+    def __init__(self, items, page_size, continuation_token):
+        self._items = items
+        self._page_size = page_size
+        self._offset = int(continuation_token or 0)
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._offset >= len(self._items) and self._offset > 0:
+            raise StopIteration
+        page = self._items[self._offset:self._offset + self._page_size]
+        self._offset += self._page_size
+        self.continuation_token = str(self._offset) if self._offset < len(self._items) else None
+        return iter(page)
+
+
+class _BlobListing:
+    def __init__(self, items, page_size):
+        self._items = items
+        self._page_size = page_size
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def by_page(self, continuation_token=None):
+        return _Pages(self._items, self._page_size, continuation_token)
+
+
+class FakeBlobClient:
+    def __init__(self, service, container, blob):
+        self._service = service
+        self.container_name = container
+        self.blob_name = blob
+        self.url = f"{service.url}/{container}/{blob}"
+
+    def upload_blob(self, data, overwrite=False, content_settings=None, etag=None, match_condition=None, **kwargs):
+        self._service.latency.sleep()
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        with self._service.lock:
+            key = (self.container_name, self.blob_name)
+            if not overwrite and key in self._service.blobs:
+                raise ResourceExistsError("The specified blob already exists.")
+            current = self._service.blobs.get(key)
+            if match_condition == MatchConditions.IfNotModified and (current is None or current.etag != etag):
+                raise ResourceModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+            blob = _StoredBlob(bytes(data), getattr(content_settings, "content_type", None))
+            self._service.blobs[key] = blob
+
+        return {"etag": blob.etag, "last_modified": blob.last_modified}
+
+    def _get(self):
+        with self._service.lock:
+            blob = self._service.blobs.get((self.container_name, self.blob_name))
+        if blob is None:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        return blob
+
+    def download_blob(self, etag=None, match_condition=None, **kwargs):
+        self._service.latency.sleep()
+        blob = self._get()
+        if match_condition == MatchConditions.IfModified and etag == blob.etag:
+            raise ResourceNotModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+        return _Downloader(blob)
+
+    def get_blob_properties(self, **kwargs):
+        self._service.latency.sleep()
+        blob = self._get()
+        return SimpleNamespace(etag=blob.etag, last_modified=blob.last_modified, size=len(blob.data))
+
+
+class FakeContainerClient:
+    def __init__(self, service, name):
+        self._service = service
+        self.container_name = name
+
+    def get_blob_client(self, blob):
+        return FakeBlobClient(self._service, self.container_name, blob)
+
+    def list_blobs(self, name_starts_with="", results_per_page=5000, **kwargs):
+        self._service.latency.sleep()
+        with self._service.lock:
+            items = [
+                _BlobItem(name=name, size=len(blob.data), last_modified=blob.last_modified, etag=blob.etag)
+                for (container, name), blob in sorted(self._service.blobs.items())
+                if container == self.container_name and name.startswith(name_starts_with or "")
+            ]
+        return _BlobListing(items, results_per_page or 5000)
+
+    def delete_blobs(self, *names, raise_on_any_failure=True, **kwargs):
+        self._service.latency.sleep()
+        responses = []
+        with self._service.lock:
+            for name in names:
+                found = self._service.blobs.pop((self.container_name, name), None)
+                responses.append(SimpleNamespace(
+                    status_code=202 if found else 404,
+                    request=SimpleNamespace(url=f"{self._service.url}/{self.container_name}/{name}")
+                ))
+        return iter(responses)
+
+
+class FakeBlobServiceClient:
+    def __init__(self, latency=None, account_name="benchaccount"):
+        self.latency = latency or Latency()
+        self.account_name = account_name
+        self.url = f"https://{account_name}.blob.core.windows.net"
+        # Any base64 value signs SAS tokens offline
+        self.credential = SimpleNamespace(account_key=base64.b64encode(b"benchmark-account-key").decode("ascii"))
+        self.blobs = {}
+        self.lock = threading.Lock()
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self, container, blob)
+
+    def get_container_client(self, container):
+        return FakeContainerClient(self, container)
+
+
+# Azure OpenAI
+
+def _completion(content, prompt_chars):
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_chars // 4,
+        completion_tokens=len(content) // 4,
+        total_tokens=(prompt_chars + len(content)) // 4
+    )
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content, refusal=None), finish_reason="stop")],
+        usage=usage
+    )
+
+
+class _FakeChatCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        self._owner.chat_latency.sleep()
+
+        if response_format:
+            return _completion(json.dumps(self._owner.structured_resume), prompt_chars)
+        return _completion(self._owner.enhanced_resume, prompt_chars)
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, input, model, dimensions=None, **kwargs):
+        self._owner.embedding_latency.sleep()
+        texts = [input] if isinstance(input, str) else list(input)
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=fake_embedding(text, dimensions or EMBEDDING_DIM))
+                for i, text in enumerate(texts)
+            ],
+            usage=SimpleNamespace(prompt_tokens=sum(len(t) for t in texts) // 4, total_tokens=sum(len(t) for t in texts) // 4)
+        )
+
+
+class FakeOpenAIClient:
+    def __init__(self, chat_latency=None, embedding_latency=None):
+        self.chat_latency = chat_latency or Latency()
+        self.embedding_latency = embedding_latency or Latency()
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(self))
+        self.embeddings = _FakeEmbeddings(self)
+
+        self.structured_resume = {
+            "full_name": "Alex Example",
+            "location": "Amsterdam",
+            "summary": "Backend engineer focused on data platforms and search.",
+            "skills": ["Python", "Azure", "SQL", "Kubernetes", "Search", "Machine Learning"],
+            "certifications": ["AZ-204"],
+            "work_experience": [{
+                "company": "Contoso",
+                "title": "Senior Engineer",
+                "start_date": "2019",
+                "end_date": "2024",
+                "responsibilities": "Built hybrid search and ingestion pipelines."
+            }],
+            "education": "MSc Computer Science",
+            "languages": ["English", "Dutch"],
+            "publications": [],
+            "search_keywords": ["python", "azure", "sql", "search", "data platform", "kubernetes"]
+        }
+        self.enhanced_resume = "\n".join(
+            ["**Alex Example**", "### Summary", "Backend engineer focused on data platforms and search.", "### Skills"]
+            + [f"- Skill {i}: delivered measurable results" for i in range(40)]
+        )
+
+
+# Cognitive Search
+
+class FakeSearchClient:
+    def __init__(self, documents, latency=None):
+        self.latency = latency or Latency()
+        self._lock = threading.Lock()
+        self._by_key = {doc["id"]: doc for doc in documents}
+        self._refresh()
+
+    def _refresh(self):
+        # Swapped in as one tuple so concurrent searches never pair documents with another matrix
+        documents = list(self._by_key.values())
+        matrix = np.asarray([doc["embedding"] for doc in documents], dtype=np.float32).reshape(len(documents), -1)
+        self._snapshot = (documents, matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12))
+
+    def _index_result(self, key):
+        return SimpleNamespace(key=key, succeeded=True, status_code=200, error_message=None)
+
+    def merge_or_upload_documents(self, documents, **kwargs):
+        self.latency.sleep()
+        with self._lock:
+            for doc in documents:
+                self._by_key[doc["id"]] = {**self._by_key.get(doc["id"], {}), **doc}
+            self._refresh()
+        return [self._index_result(doc["id"]) for doc in documents]
+
+    def delete_documents(self, documents, **kwargs):
+        self.latency.sleep()
+        with self._lock:
+            for doc in documents:
+                self._by_key.pop(doc["id"], None)
+            self._refresh()
+        return [self._index_result(doc["id"]) for doc in documents]
+
+    def search(self, search_text=None, vector_queries=None, top=50, select=None, **kwargs):
+        self.latency.sleep()
+        documents, matrix = self._snapshot
+
+        def project(doc, score):
+            fields = select or [name for name in doc if name != "embedding"]
+            result = {name: doc.get(name) for name in fields}
+            result["@search.score"] = score
+            return result
+
+        if vector_queries:
+            query = np.asarray(vector_queries[0].vector, dtype=np.float32)
+            scores = matrix @ (query / np.linalg.norm(query))
+            order = np.argsort(-scores)[:top]
+            return iter([project(documents[i], float(scores[i])) for i in order])
+
+        if search_text and search_text != "*":
+            terms = {term.strip().lower() for term in search_text.split(",") if term.strip()}
+            scored = []
+            for doc in documents:
+                haystack = f"{doc.get('title', '')} {doc.get('req_skills', '')}".lower()
+                score = float(sum(term in haystack for term in terms))
+                if score:
+                    scored.append((score, doc))
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            return iter([project(doc, score) for score, doc in scored[:top]])
+
+        # Full export, as the local vector index sync requests it
+        return iter([project(doc, 1.0) for doc in documents])
+
+
+# Azure SQL (SQLite with the assignment table attached as schema "dbo")
+
+class FakeSqlCursor:
+    def __init__(self, cursor, latency):
+        self._cursor = cursor
+        self._latency = latency
+
+    def execute(self, sql, *params):
+        # pyodbc takes parameters positionally; T-SQL "SELECT TOP (?)" becomes a trailing LIMIT
+        self._latency.sleep()
+        top = re.match(r"SELECT TOP \(\?\) (.*)$", sql, re.DOTALL)
+        if top:
+            sql, params = f"SELECT {top.group(1)} LIMIT ?", params[1:] + params[:1]
+        self._cursor.execute(sql, params)
+        return self
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class FakeSqlConnection:
+    def __init__(self, database_path, latency=None):
+        self._latency = latency or Latency()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute("ATTACH DATABASE ? AS dbo", (database_path,))
+
+    def cursor(self):
+        return FakeSqlCursor(self._conn.cursor(), self._latency)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def create_assignment_database(database_path, assignments):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("ATTACH DATABASE ? AS dbo", (database_path,))
+    conn.execute("DROP TABLE IF EXISTS dbo.assignmentList")
+    conn.execute(
+        "CREATE TABLE dbo.assignmentList ("
+        " id INTEGER PRIMARY KEY, title TEXT, company TEXT, location TEXT,"
+        " type TEXT, job_desc TEXT, req_skills TEXT, key_responsibilities TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO dbo.assignmentList VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (a["id"], a["title"], a["company"], a["location"], a["type"], a["job_desc"], a["req_skills"], a["key_responsibilities"])
+            for a in assignments
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def resume_text(index):
+    lines = [f"Candidate {index}", "Summary", "Backend engineer focused on data platforms and search."]
+    for job in range(6):
+        lines += [
+            f"Company {job} - Senior Engineer (20{10 + job} - 20{11 + job})",
+            "Built hybrid search, ingestion pipelines and Azure Functions APIs in Python.",
+        ]
+    lines += ["Skills", "Python, Azure, SQL, Kubernetes, Search, Machine Learning"]
+    return "\n".join(lines)
+
+
+def build_assignments(count, chunks_per_assignment=3):
+    skills = ["Python", "Azure", "SQL", "Kubernetes", "React", "Java", "Search", "Machine Learning", "Go", "Spark"]
+    assignments = []
+    documents = []
+    for i in range(1, count + 1):
+        req_skills = ", ".join(skills[(i + k) % len(skills)] for k in range(4))
+        assignment = {
+            "id": i,
+            "title": f"Engineer {i}",
+            "company": f"Company {i % 37}",
+            "location": "Remote" if i % 3 else "Amsterdam",
+            "type": "Freelance" if i % 2 else "Permanent",
+            "job_desc": f"Assignment {i} working on {req_skills}. " * 20,
+            "req_skills": req_skills,
+            "key_responsibilities": "Design, build and operate services."
+        }
+        assignments.append(assignment)
+        for chunk in range(chunks_per_assignment):
+            documents.append({
+                "id": f"{i}_{chunk}",
+                "gtd_id": str(i),
+                "title": assignment["title"],
+                "company": assignment["company"],
+                "location": assignment["location"],
+                "type": assignment["type"],
+                "req_skills": req_skills,
+                "key_responsibilities": assignment["key_responsibilities"],
+                "embedding": fake_embedding(f"{i}_{chunk} {req_skills}")
+            })
+    return assignments, documents
+
+
+class FakeOut:
+    # Stand-in for a func.Out output binding
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def multipart_body(field, filename, data, content_type="text/plain"):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    body.write(f"--{boundary}\r\n".encode())
+    body.write(f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode())
+    body.write(f"Content-Type: {content_type}\r\n\r\n".encode())
+    body.write(data)
+    body.write(f"\r\n--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
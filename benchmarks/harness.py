@@ -0,0 +1,264 @@
+# Benchmark harness: runs the HTTP handlers in-process against the fakes in
+# benchmarks/fakes.py and reports latency percentiles, throughput and peak RSS.
+#
+#   python -m benchmarks.harness
+#   python -m benchmarks.harness --scenarios assignmentsMatch,enhanceResume --concurrency 1,8,32 \
+#       --requests 200 --latency chat=800:150,embeddings=60,search=40,blob=8,sql=3 --json bench.json
+#
+# Run from the repository root. --cold disables the resume and assignment caches and
+# regenerates enhanced CVs, so every request pays for the full pipeline (repeat
+# keyword strings are still served by the embedding cache) and makes ingestAssignments
+# re-index the whole catalog instead of the incremental pass.
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SCENARIOS = [
+    "assignmentsMatch",
+    "enhanceResume",
+    "getAssignmentDetailsById",
+    "uploadFilesToBlobStorage",
+    "getResumesFromBlobStorage",
+    "ingestAssignments",
+]
+
+DEFAULT_LATENCY = {"chat": "0", "embeddings": "0", "search": "0", "blob": "0", "sql": "0"}
+
+CONTAINER_NAME = "gtfydemo"
+RESUME_FOLDER = "resume"
+
+
+def _configure_environment(work_dir, cold):
+    # Must run before the function modules are imported, they read their settings at import time
+    defaults = {
+        "AZURE_OPENAI_DEPLOYMENT": "bench-chat",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "bench-embedding",
+        "AZURE_OPENAI_API_VERSION": "2024-08-01-preview",
+        "SEARCH_INDEX": "bench-index",
+        "SEARCH_ENGINE": "remote",
+        "JOB_QUEUE_BACKEND": "sqlite",
+        "ASSIGNMENT_INGESTION_ENABLED": "true",
+        "RESUME_CLEANUP_MODE": "inline",
+        "RESUME_CACHE_PATH": os.path.join(work_dir, "resume_cache.sqlite3"),
+        "EMBEDDING_CACHE_DIR": os.path.join(work_dir, "embedding_cache"),
+        "LOCAL_VECTOR_INDEX_DIR": os.path.join(work_dir, "vector_index"),
+        "JOB_SQLITE_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    if cold:
+        os.environ["RESUME_CACHE_TTL_SECONDS"] = "-1"
+        os.environ["ASSIGNMENT_CACHE_TTL_SECONDS"] = "-1"
+
+
+def _install_fakes(args, work_dir):
+    from benchmarks.fakes import (
+        Latency, FakeBlobServiceClient, FakeOpenAIClient, FakeSearchClient, FakeSqlConnection,
+        build_assignments, create_assignment_database, resume_text
+    )
+    from clientPool import override_client, set_sql_connection_factory
+
+    latency = {name: Latency.parse(spec) for name, spec in {**DEFAULT_LATENCY, **args.latency}.items()}
+
+    blob_service = FakeBlobServiceClient(latency["blob"])
+    for i in range(args.resumes):
+        blob_service.get_blob_client(CONTAINER_NAME, f"{RESUME_FOLDER}/resume_{i:04d}.txt").upload_blob(
+            resume_text(i).encode("utf-8"), overwrite=True
+        )
+
+    assignments, documents = build_assignments(args.assignments, args.chunks_per_assignment)
+    database_path = os.path.join(work_dir, "assignments.sqlite3")
+    create_assignment_database(database_path, assignments)
+
+    override_client("blob", blob_service)
+    override_client("openai", FakeOpenAIClient(latency["chat"], latency["embeddings"]))
+    override_client(f"search:{os.environ['SEARCH_INDEX']}", FakeSearchClient(documents, latency["search"]))
+    set_sql_connection_factory(lambda: FakeSqlConnection(database_path, latency["sql"]))
+
+    return [a["id"] for a in assignments]
+
+
+def _user_function(handler):
+    # Decorated handlers are FunctionBuilders; build() exposes the plain function
+    return handler.build().get_user_function() if hasattr(handler, "build") else handler
+
+
+def _request_factories(assignment_ids, cold):
+    import azure.functions as func
+    from benchmarks.fakes import FakeOut, multipart_body, resume_text
+    from function_app import assignmentsMatch
+    from enhanceCV import enhanceResume
+    from getAssignmentDetails import getAssignmentDetailsById
+    from uploadToBlobStorage import uploadFilesToBlobStorage
+    from getFilesFromBlobStorage import getResumesFromBlobStorage
+    from assignmentIngestion import ingestAssignments
+
+    (
+        assignmentsMatch, enhanceResume, getAssignmentDetailsById, uploadFilesToBlobStorage,
+        getResumesFromBlobStorage, ingestAssignments
+    ) = map(
+        _user_function,
+        (
+            assignmentsMatch, enhanceResume, getAssignmentDetailsById, uploadFilesToBlobStorage,
+            getResumesFromBlobStorage, ingestAssignments
+        )
+    )
+
+    def match(i):
+        return assignmentsMatch(func.HttpRequest(
+            method="GET", url="/api/assignmentsMatch", body=b"",
+            params={"include_details": "true", "top": "30"}
+        ))
+
+    def enhance(i):
+        payload = {"job_desc": f"Assignment {i % 50} on Python, Azure and search.", "req_skills": "Python, Azure, SQL"}
+        if cold:
+            payload["regenerate"] = True
+        return enhanceResume(func.HttpRequest(
+            method="POST", url="/api/enhanceCV", body=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        ))
+
+    def details(i):
+        return getAssignmentDetailsById(func.HttpRequest(
+            method="GET", url="/api/getAssignmentDetails", body=b"",
+            params={"job_id": str(assignment_ids[i % len(assignment_ids)])}
+        ))
+
+    def upload(i):
+        body, content_type = multipart_body("file", f"upload_{i:06d}.txt", resume_text(i).encode("utf-8"))
+        return uploadFilesToBlobStorage(func.HttpRequest(
+            method="POST", url="/api/uploadToBlobStorage", body=body,
+            headers={"Content-Type": content_type}
+        ), FakeOut())
+
+    def list_files(i):
+        return getResumesFromBlobStorage(func.HttpRequest(
+            method="GET", url="/api/getFilesFromBlobStorage", body=b"", params={"page_size": "100"}
+        ))
+
+    def ingest(i):
+        return ingestAssignments(func.HttpRequest(
+            method="POST", url="/api/ingestAssignments", body=b"",
+            params={"full": "true" if cold else "false"}
+        ))
+
+    return {
+        "assignmentsMatch": match,
+        "enhanceResume": enhance,
+        "getAssignmentDetailsById": details,
+        "uploadFilesToBlobStorage": upload,
+        "getResumesFromBlobStorage": list_files,
+        "ingestAssignments": ingest,
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name, call, requests, concurrency, warmup):
+    for i in range(warmup):
+        call(i)
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            response = call(i)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, range(warmup, warmup + requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array([duration for duration, _ in outcomes]) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies_ms.max()), 2),
+        "throughput_rps": round(requests / elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _parse_latency(value):
+    specs = {}
+    for item in filter(None, value.split(",")):
+        name, _, spec = item.partition("=")
+        if name not in DEFAULT_LATENCY:
+            raise argparse.ArgumentTypeError(f"Unknown latency target '{name}', expected one of {', '.join(DEFAULT_LATENCY)}")
+        specs[name] = spec
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the function handlers against local fakes.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests before each run")
+    parser.add_argument("--latency", type=_parse_latency, default={},
+                        help="Injected latency per backend, e.g. chat=800:150,embeddings=60,search=40,blob=8,sql=3 (ms[:jitter])")
+    parser.add_argument("--resumes", type=int, default=20, help="Resumes seeded into the fake container")
+    parser.add_argument("--assignments", type=int, default=500, help="Assignments seeded into SQL and the search index")
+    parser.add_argument("--chunks-per-assignment", type=int, default=3)
+    parser.add_argument("--cold", action="store_true", help="Bypass the resume/assignment caches and regenerate CVs")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="gtfy_bench_")
+    _configure_environment(work_dir, args.cold)
+    assignment_ids = _install_fakes(args, work_dir)
+    factories = _request_factories(assignment_ids, args.cold)
+
+    results = []
+    header = f"{'scenario':<28}{'conc':>5}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name in scenarios:
+        for concurrency in (int(c) for c in args.concurrency.split(",") if c):
+            result = run_scenario(name, factories[name], args.requests, concurrency, args.warmup)
+            results.append(result)
+            print(
+                f"{name:<28}{concurrency:>5}{result['requests']:>6}{result['errors']:>5}"
+                f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{result['throughput_rps']:>9.1f}{result['peak_rss_mb']:>9.1f}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    # Handler logging at INFO would dominate the measurements
+    import logging
+    logging.disable(logging.INFO)
+    main()
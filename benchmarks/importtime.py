@@ -0,0 +1,146 @@
+# Import-time profile of the function modules, from `python -X importtime`.
+#
+#   python -m benchmarks.importtime
+#   python -m benchmarks.importtime --modules function_app,enhanceCV --runs 9 --top 20
+#   python -m benchmarks.importtime --baseline benchmarks/importtime_baseline.json --check
+#   python -m benchmarks.importtime --write-baseline benchmarks/importtime_baseline.json
+#
+# Run from the repository root, in the same environment the app runs in. Each run is
+# a fresh interpreter; the median is reported. The Functions worker has already loaded
+# azure.functions and asyncio before it indexes function_app, so those are imported
+# up front (--preload) and don't count. Baselines are machine specific: compare
+# against one written on the same machine and Python version.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "function_app",
+    "getAssignmentDetails",
+    "getFilesFromBlobStorage",
+    "uploadToBlobStorage",
+    "enhanceCV",
+    "assignmentIngestion",
+]
+DEFAULT_PRELOAD = "azure.functions,asyncio"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def profile_module(module, preload):
+    statements = [f"import {name}" for name in preload] + ["import sys", "sys.stderr.write('-- start --\\n')"]
+    statements.append(f"import {module}")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(statements)],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+
+    entries = _parse_importtime(result.stderr.split("-- start --", 1)[1])
+    total_us = next(cumulative for name, _, cumulative in reversed(entries) if name == module)
+
+    # Self time grouped by top-level package shows which dependency dominates
+    packages = {}
+    for name, self_us, _ in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return total_us, packages
+
+
+def run(modules, runs, preload):
+    results = {}
+    for module in modules:
+        totals, package_runs = [], []
+        for _ in range(runs):
+            total_us, packages = profile_module(module, preload)
+            totals.append(total_us)
+            package_runs.append(packages)
+
+        names = set().union(*package_runs)
+        packages_ms = {
+            name: round(statistics.median(p.get(name, 0) for p in package_runs) / 1000, 2)
+            for name in names
+        }
+        results[module] = {
+            "median_ms": round(statistics.median(totals) / 1000, 2),
+            "min_ms": round(min(totals) / 1000, 2),
+            "packages_ms": dict(sorted(packages_ms.items(), key=lambda item: -item[1])),
+        }
+    return results
+
+
+def _print_results(results, top, baseline):
+    for module, result in results.items():
+        line = f"{module:<28}{result['median_ms']:>10.1f} ms (min {result['min_ms']:.1f})"
+        previous = (baseline or {}).get(module)
+        if previous:
+            delta = result["median_ms"] - previous["median_ms"]
+            line += f"   baseline {previous['median_ms']:.1f} ms ({delta:+.1f})"
+        print(line)
+        for name, ms in list(result["packages_ms"].items())[:top]:
+            print(f"    {name:<36}{ms:>8.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile import time of the function modules.")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed per module")
+    parser.add_argument("--preload", default=DEFAULT_PRELOAD, help="Modules imported before timing starts")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when a module is slower than the baseline allows")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown for --check, as a fraction")
+    parser.add_argument("--write-baseline", help="Write the results to this baseline file")
+    args = parser.parse_args(argv)
+
+    modules = [name for name in args.modules.split(",") if name]
+    preload = [name for name in args.preload.split(",") if name]
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = run(modules, args.runs, preload)
+    _print_results(results, args.top, baseline)
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "preload": preload,
+                "runs": args.runs,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+
+    if args.check and baseline:
+        regressions = [
+            module for module, result in results.items()
+            if module in baseline and result["median_ms"] > baseline[module]["median_ms"] * (1 + args.tolerance)
+        ]
+        if regressions:
+            print(f"Import time regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from telemetry import sdk_retry_hook
+
+# Process-wide clients, created lazily on first use and reused by every
+# invocation handled by this worker. All of these SDK clients are thread safe.
+# The SDKs are imported inside the getters as well: a cold start only loads
+# the ones the first route actually touches.
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "120"))
+
+# Blob transfers: uploads above the single-put size are staged as blocks, in parallel
+BLOB_MAX_BLOCK_SIZE = int(os.getenv("BLOB_MAX_BLOCK_SIZE", str(4 * 1024 * 1024)))
+BLOB_MAX_SINGLE_PUT_SIZE = int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", str(8 * 1024 * 1024)))
+BLOB_TRANSFER_CONCURRENCY = int(os.getenv("BLOB_TRANSFER_CONCURRENCY", "4"))
+
+# pyodbc connections are not shareable across threads, so they are pooled instead
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "8"))
+SQL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("SQL_HEALTHCHECK_IDLE_SECONDS", "30"))
+
+# Refresh the Entra ID token this long before it actually expires
+SQL_TOKEN_REFRESH_MARGIN_SECONDS = 300
+SQL_TOKEN_SCOPE = "https://database.windows.net/.default"
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            logging.info(f"Creating shared client: {name}")
+            client = factory()
+            _clients[name] = client
+        return client
+
+
+def override_client(name, client):
+    # Swap in a stand-in under the name its getter uses ("blob", "openai", "search:<index>", ...);
+    # used by the benchmark harness to run the handlers without Azure
+    with _lock:
+        _clients[name] = client
+
+
+def _azure_transport():
+    import requests
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+
+def _azure_client_options(target):
+    # Shared connection pool, and SDK retries counted per request in telemetry
+    return {"transport": _azure_transport(), "raw_request_hook": sdk_retry_hook(target)}
+
+
+def get_blob_service_client():
+    from azure.storage.blob import BlobServiceClient
+
+    return _get_or_create(
+        "blob",
+        lambda: BlobServiceClient.from_connection_string(
+            os.environ["AZURE_BLOB_CONN"],
+            **_azure_client_options("blob"),
+            max_block_size=BLOB_MAX_BLOCK_SIZE,
+            max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE
+        )
+    )
+
+
+def get_blob_service_client_aad():
+    # Entra ID-authenticated client, needed for user delegation keys
+    from azure.storage.blob import BlobServiceClient
+
+    return _get_or_create(
+        "blob-aad",
+        lambda: BlobServiceClient(
+            account_url=get_blob_service_client().url,
+            credential=get_azure_credential(),
+            **_azure_client_options("blob")
+        )
+    )
+
+
+def get_queue_client(queue_name):
+    # Base64 messages, as the Functions queue trigger expects by default
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    return _get_or_create(
+        f"queue:{queue_name}",
+        lambda: QueueClient.from_connection_string(
+            os.environ["AzureWebJobsStorage"],
+            queue_name,
+            message_encode_policy=TextBase64EncodePolicy(),
+            **_azure_client_options("queue")
+        )
+    )
+
+
+def get_openai_client():
+    import httpx
+    from openai import AzureOpenAI
+
+    return _get_or_create(
+        "openai",
+        lambda: AzureOpenAI(
+            api_key=os.environ["AZURE_OPENAI_KEY"],
+            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                ),
+                timeout=httpx.Timeout(120.0, connect=10.0)
+            ),
+            # llmGateway owns retries so it can back off per deployment and fail over
+            max_retries=0
+        )
+    )
+
+
+def get_search_client(index_name=None):
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+
+    index_name = index_name or os.environ["SEARCH_INDEX"]
+    return _get_or_create(
+        f"search:{index_name}",
+        lambda: SearchClient(
+            endpoint=os.environ["SEARCH_ENDPOINT"],
+            index_name=index_name,
+            credential=AzureKeyCredential(os.environ["SEARCH_KEY"]),
+            **_azure_client_options("search")
+        )
+    )
+
+
+def get_document_intelligence_client():
+    from azure.core.credentials import AzureKeyCredential
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+    return _get_or_create(
+        "documentintelligence",
+        lambda: DocumentIntelligenceClient(
+            endpoint=os.environ["AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT"],
+            credential=AzureKeyCredential(os.environ["AZURE_DOCUMENT_INTELLIGENCE_KEY"]),
+            **_azure_client_options("documentintelligence")
+        )
+    )
+
+
+# Async clients hold an aiohttp/httpx session bound to the running event loop,
+# so they are shared per loop rather than per process.
+def _loop_key(name):
+    return f"{name}@{id(asyncio.get_running_loop())}"
+
+
+def get_async_blob_service_client():
+    from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+
+    return _get_or_create(
+        _loop_key("blob-async"),
+        lambda: AsyncBlobServiceClient.from_connection_string(
+            os.environ["AZURE_BLOB_CONN"],
+            raw_request_hook=sdk_retry_hook("blob")
+        )
+    )
+
+
+def get_async_openai_client():
+    import httpx
+    from openai import AsyncAzureOpenAI
+
+    return _get_or_create(
+        _loop_key("openai-async"),
+        lambda: AsyncAzureOpenAI(
+            api_key=os.environ["AZURE_OPENAI_KEY"],
+            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                ),
+                timeout=httpx.Timeout(120.0, connect=10.0)
+            ),
+            # llmGateway owns retries so it can back off per deployment and fail over
+            max_retries=0
+        )
+    )
+
+
+def get_async_search_client(index_name=None):
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+
+    index_name = index_name or os.environ["SEARCH_INDEX"]
+    return _get_or_create(
+        _loop_key(f"search-async:{index_name}"),
+        lambda: AsyncSearchClient(
+            endpoint=os.environ["SEARCH_ENDPOINT"],
+            index_name=index_name,
+            credential=AzureKeyCredential(os.environ["SEARCH_KEY"]),
+            raw_request_hook=sdk_retry_hook("search")
+        )
+    )
+
+
+def get_async_document_intelligence_client():
+    from azure.core.credentials import AzureKeyCredential
+    from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as AsyncDocumentIntelligenceClient
+
+    return _get_or_create(
+        _loop_key("documentintelligence-async"),
+        lambda: AsyncDocumentIntelligenceClient(
+            endpoint=os.environ["AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT"],
+            credential=AzureKeyCredential(os.environ["AZURE_DOCUMENT_INTELLIGENCE_KEY"]),
+            raw_request_hook=sdk_retry_hook("documentintelligence")
+        )
+    )
+
+
+def get_azure_credential():
+    from azure.identity import DefaultAzureCredential
+
+    return _get_or_create("azure-credential", DefaultAzureCredential)
+
+
+_sql_token = None
+_sql_token_lock = threading.Lock()
+
+
+def _sql_access_token():
+    global _sql_token
+
+    with _sql_token_lock:
+        if _sql_token is None or _sql_token.expires_on - SQL_TOKEN_REFRESH_MARGIN_SECONDS <= time.time():
+            logging.info("Fetching Azure SQL access token")
+            _sql_token = get_azure_credential().get_token(SQL_TOKEN_SCOPE)
+        token = _sql_token.token
+
+    # ODBC expects a length-prefixed UTF-16-LE token struct
+    encoded = token.encode('utf-16-le')
+    return struct.pack(f'<I{len(encoded)}s', len(encoded), encoded)
+
+
+def _sql_connection_string():
+    server = os.getenv('DB_SERVER')
+    database = os.getenv('DB_NAME')
+    driver = '{ODBC Driver 18 for SQL Server}'
+
+    # No Authentication= keyword, the cached access token is passed at connect time
+    return (
+        f'DRIVER={driver};'
+        f'SERVER={server};'
+        f'DATABASE={database};'
+        f'Encrypt=yes;'
+        f'TrustServerCertificate=yes;'
+    )
+
+
+def _open_sql_connection():
+    import pyodbc
+
+    logging.info("Opening pooled SQL connection")
+    return pyodbc.connect(
+        _sql_connection_string(),
+        attrs_before={SQL_COPT_SS_ACCESS_TOKEN: _sql_access_token()}
+    )
+
+
+_sql_pool = queue.LifoQueue(maxsize=SQL_POOL_SIZE)
+_sql_connection_factory = None
+
+
+def set_sql_connection_factory(factory):
+    # None restores the pyodbc connection; pooled connections from the old factory are dropped
+    global _sql_connection_factory
+
+    _sql_connection_factory = factory
+    while True:
+        try:
+            conn, _ = _sql_pool.get_nowait()
+        except queue.Empty:
+            break
+        _close_quietly(conn)
+
+
+def _is_healthy(conn, last_used):
+    import pyodbc
+
+    if time.monotonic() - last_used < SQL_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        conn.cursor().execute("SELECT 1").fetchone()
+        return True
+    except pyodbc.Error:
+        return False
+
+
+@contextmanager
+def sql_connection():
+    import pyodbc
+
+    conn = None
+    while conn is None:
+        try:
+            candidate, last_used = _sql_pool.get_nowait()
+        except queue.Empty:
+            conn = (_sql_connection_factory or _open_sql_connection)()
+            break
+
+        if _is_healthy(candidate, last_used):
+            conn = candidate
+        else:
+            logging.info("Discarding stale pooled SQL connection")
+            _close_quietly(candidate)
+
+    try:
+        yield conn
+    except pyodbc.Error:
+        # Connection state is unknown after a driver error, don't hand it out again
+        _close_quietly(conn)
+        raise
+    except BaseException:
+        _release(conn)
+        raise
+    else:
+        _release(conn)
+
+
+def _release(conn):
+    import pyodbc
+
+    try:
+        conn.rollback()
+        _sql_pool.put_nowait((conn, time.monotonic()))
+    except (queue.Full, pyodbc.Error):
+        _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    import pyodbc
+
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
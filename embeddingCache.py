@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single local worker, no cross-process locking
+    fcntl = None
+
+from telemetry import record_cache
+
+# Local cache of embedding vectors, keyed by normalised text + deployment (+ dimensions).
+# Vectors served by any of AZURE_OPENAI_EMBEDDING_DEPLOYMENTS are filed under the primary
+# deployment; llmGateway rejects responses from a deployment serving a different model.
+# Vectors live as float16 rows in memory-mapped files shared by the worker processes.
+# The files are a set-associative table: a key can only live in the CACHE_WAYS slots
+# after its hash, each slot stores its key digest and last-use time, and a full set
+# reuses its least recently used slot. All of that state is in the files, so every
+# process sees the same slots; reads take a shared flock and writes an exclusive one.
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gtfy_embedding_cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+
+# text-embedding-3 models can return shorter vectors; must match the search index field
+_dimensions = os.getenv("AZURE_OPENAI_EMBEDDING_DIMENSIONS")
+EMBEDDING_DIMENSIONS = int(_dimensions) if _dimensions else None
+
+KEY_BYTES = 16
+CACHE_WAYS = 8
+CACHE_FORMAT = 2
+
+
+def normalize_text(text) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def embedding_options() -> dict:
+    return {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {}
+
+
+class EmbeddingCache:
+    def __init__(self, deployment, dimensions=None, directory=EMBEDDING_CACHE_DIR, capacity=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.deployment = deployment
+        self.dimensions = dimensions
+        self.capacity = max(capacity, CACHE_WAYS)
+
+        name = f"{deployment}_{dimensions or 'native'}"
+        self.meta_path = os.path.join(directory, f"{name}.json")
+        self.vectors_path = os.path.join(directory, f"{name}.f16")
+        self.keys_path = os.path.join(directory, f"{name}.keys")
+        self.stamps_path = os.path.join(directory, f"{name}.stamps")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._keys = None
+        self._stamps = None
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_path, "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _key(self, text) -> bytes:
+        digest = hashlib.sha256(f"{self.deployment}|{self.dimensions or ''}|{normalize_text(text)}".encode("utf-8"))
+        return digest.digest()[:KEY_BYTES]
+
+    def _window(self, key):
+        import numpy as np
+
+        start = int.from_bytes(key[:8], "little") % self.capacity
+        return (start + np.arange(CACHE_WAYS)) % self.capacity
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable embedding cache {self.meta_path}: {e}")
+            return None
+
+        if meta.get("format") != CACHE_FORMAT or meta.get("capacity") != self.capacity:
+            return None
+        return meta
+
+    def _open(self, dim, mode):
+        import numpy as np
+
+        self.dim = dim
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode=mode, shape=(self.capacity, dim))
+        self._keys = np.memmap(self.keys_path, dtype=np.uint8, mode=mode, shape=(self.capacity, KEY_BYTES))
+        self._stamps = np.memmap(self.stamps_path, dtype=np.float64, mode=mode, shape=(self.capacity,))
+
+    def _ensure_open(self, dim=None) -> bool:
+        # Called under the file lock; dim is given by writers, which create the files if needed
+        if self._vectors is not None:
+            return True
+
+        meta = self._read_meta()
+        if meta:
+            self._open(meta["dim"], "r+")
+            return True
+        if dim is None:
+            return False
+
+        self._open(dim, "w+")
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": CACHE_FORMAT, "dim": dim, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self.meta_path)
+        return True
+
+    def get_many(self, texts) -> dict:
+        import numpy as np
+
+        found = {}
+        with self._lock, self._file_lock(exclusive=False):
+            if not self._ensure_open():
+                return found
+
+            now = time.time()
+            for text in texts:
+                key = self._key(text)
+                window = self._window(key)
+                matches = np.flatnonzero((self._keys[window] == np.frombuffer(key, dtype=np.uint8)).all(axis=1))
+                if not len(matches):
+                    continue
+                slot = window[matches[0]]
+                self._stamps[slot] = now
+                found[text] = self._vectors[slot].astype(np.float32).tolist()
+        return found
+
+    def put_many(self, vectors_by_text):
+        import numpy as np
+
+        if not vectors_by_text:
+            return
+
+        dim = len(next(iter(vectors_by_text.values())))
+        with self._lock, self._file_lock(exclusive=True):
+            self._ensure_open(dim)
+            if self.dim != dim:
+                logging.warning(f"Embedding cache {self.vectors_path} holds {self.dim}-d vectors; not caching {dim}-d ones.")
+                return
+
+            now = time.time()
+            for text, vector in vectors_by_text.items():
+                key = np.frombuffer(self._key(text), dtype=np.uint8)
+                window = self._window(key.tobytes())
+                keys = self._keys[window]
+
+                matches = np.flatnonzero((keys == key).all(axis=1))
+                empty = np.flatnonzero(~keys.any(axis=1))
+                if len(matches):
+                    slot = window[matches[0]]
+                elif len(empty):
+                    slot = window[empty[0]]
+                else:
+                    slot = window[np.argmin(self._stamps[window])]
+
+                # Key cleared first, so a write cut short (killed worker) leaves a miss, not a wrong vector
+                self._keys[slot] = 0
+                self._vectors[slot] = np.asarray(vector, dtype=np.float16)
+                self._keys[slot] = key
+                self._stamps[slot] = now
+
+            self._vectors.flush()
+            self._keys.flush()
+            self._stamps.flush()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(deployment=None) -> EmbeddingCache:
+    deployment = deployment or os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
+
+    with _caches_lock:
+        cache = _caches.get(deployment)
+        if cache is None:
+            cache = _caches[deployment] = EmbeddingCache(deployment, EMBEDDING_DIMENSIONS)
+        return cache
+
+
+def _split_misses(texts, cache):
+    cached = cache.get_many(texts)
+    # One request per distinct normalised text
+    missing = {}
+    for text in texts:
+        if text not in cached:
+            missing.setdefault(normalize_text(text), text)
+    logging.info(f"Embedding cache: {len(cached)} hit(s), {len(missing)} text(s) to embed")
+    record_cache("embedding", hits=len(texts) - len(missing), misses=len(missing))
+    return cached, list(missing.values())
+
+
+def _fill(texts, cached, fresh):
+    by_normalized = {normalize_text(text): vector for text, vector in fresh.items()}
+    return [cached[text] if text in cached else by_normalized[normalize_text(text)] for text in texts]
+
+
+def embed_with_cache(texts, embed_fn) -> list:
+    # embed_fn(list_of_texts) -> list of vectors, only called for texts not in the cache
+    cache = get_embedding_cache()
+    cached, missing = _split_misses(texts, cache)
+
+    fresh = {}
+    if missing:
+        fresh = dict(zip(missing, embed_fn(missing)))
+        cache.put_many(fresh)
+
+    return _fill(texts, cached, fresh)
+
+
+async def embed_with_cache_async(texts, embed_fn):
+    import asyncio
+
+    cache = get_embedding_cache()
+    cached, missing = await asyncio.to_thread(_split_misses, texts, cache)
+
+    fresh = {}
+    if missing:
+        fresh = dict(zip(missing, await embed_fn(missing)))
+        await asyncio.to_thread(cache.put_many, fresh)
+
+    return _fill(texts, cached, fresh)
@@ -1,43 +1,37 @@
 import azure.functions as func
 import logging
+import hashlib
+import io
 import os
-import tempfile
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from openai import AzureOpenAI
 import json
-from datetime import datetime, timedelta
-from docx import Document
-from docx.shared import Pt
-from docx.enum.style import WD_STYLE_TYPE
-from docx.oxml.ns import qn
+from azure.core.exceptions import ResourceNotFoundError
+
+from clientPool import get_blob_service_client, BLOB_TRANSFER_CONCURRENCY
+from resumeLocator import read_latest_resume
+from sasService import get_blob_sas_url
+from jobQueue import submit_job, wants_background_job, job_accepted_response
+from singleFlight import SingleFlight
+from telemetry import instrument_route, span, traced, record_cache, record_payload, record_usage
+from textExtraction import extract_text
+from llmGateway import chat_completion
+from promptBuilder import prepare_resume_text, truncate_to_tokens, ENHANCE_RESUME_MAX_TOKENS, ENHANCE_JOB_MAX_TOKENS
 
 enhanceCV = func.Blueprint()
 
-def extract_resume_text(filepath):
-    ext = os.path.splitext(filepath)[-1].lower()
-    if ext == ".pdf":
-        import fitz
-        with fitz.open(filepath) as doc:
-            return "\n".join(page.get_text() for page in doc)
-    elif ext == ".docx":
-        from docx import Document
-        doc = Document(filepath)
-        return "\n".join(p.text for p in doc.paragraphs)
-    elif ext == ".txt":
-        with open(filepath, "r", encoding="utf-8") as f:
-            return f.read()
-    else:
-        raise ValueError("Unsupported file type: " + ext)
-
-def get_latest_resume_from_folder(blob_service_client, container_name, folder_prefix):
-    container_client = blob_service_client.get_container_client(container_name)
-    blobs = list(container_client.list_blobs(name_starts_with=folder_prefix))
-    if not blobs:
-        raise FileNotFoundError(f"No files found in folder: {folder_prefix}")
-    latest_blob = max(blobs, key=lambda b: b.last_modified)
-    return latest_blob.name
-
-def save_text_to_docx(text, path):
+# Blob setup
+BLOB_CONTAINER_NAME = "gtfydemo"
+RESUME_FOLDER = "resume"
+OUTPUT_FOLDER = "enhanced_cv"
+
+# Bump when enhance_messages changes so previously generated documents are not reused
+ENHANCE_PROMPT_VERSION = "2"
+
+_enhance_flights = SingleFlight()
+
+def save_text_to_docx(text, path_or_stream):
+    from docx import Document
+    from docx.shared import Pt
+
     doc = Document()
 
     # Create and configure styles
@@ -68,45 +62,25 @@ def save_text_to_docx(text, path):
         else:
             doc.add_paragraph(line)
 
-    doc.save(path)
-
-@enhanceCV.route(route="enhanceCV", methods=["POST"])
-def enhanceResume(req: func.HttpRequest) -> func.HttpResponse:
-    logging.info('Processing resume enhancement.')
-
-    try:
-        job = req.get_json()
-        job_description = job.get("job_desc", "")
-        required_skills = job.get("req_skills", "")
-
-        if not job_description:
-            return func.HttpResponse("Job description is required.", status_code=400)
-
-        # Blob setup
-        container_name = "gtfydemo"
-        resume_folder = "resume"
-        output_folder = "enhanced_cv"
+    doc.save(path_or_stream)
 
-        blob_service = BlobServiceClient.from_connection_string(os.environ["AZURE_BLOB_CONN"])
-        blob_name = get_latest_resume_from_folder(blob_service, container_name, resume_folder)
-        blob_client = blob_service.get_blob_client(container=container_name, blob=blob_name)
+@traced("blob.download")
+def download_resume(blob_service, container_name, blob_name):
+    blob_client = blob_service.get_blob_client(container=container_name, blob=blob_name)
 
-        # Download resume
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(blob_name)[-1]) as tmp_file:
-            tmp_file.write(blob_client.download_blob().readall())
-            tmp_resume_path = tmp_file.name
+    # Download resume into memory, ranges fetched in parallel, no temp file round-trip
+    resume_stream = io.BytesIO()
+    blob_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY).readinto(resume_stream)
+    resume_stream.seek(0)
+    record_payload("resume", resume_stream.getbuffer().nbytes)
+    return resume_stream
 
-        resume_text = extract_resume_text(tmp_resume_path)
-        os.remove(tmp_resume_path)
+def enhance_messages(job_description, required_skills, resume_text):
+    # The whole resume is rewritten in one call, so it is cleaned and capped rather than chunked
+    resume_text = prepare_resume_text(resume_text, ENHANCE_RESUME_MAX_TOKENS)
+    job_description = truncate_to_tokens(job_description, ENHANCE_JOB_MAX_TOKENS)
 
-        # Call GPT-4o
-        client = AzureOpenAI(
-            api_key=os.environ["AZURE_OPENAI_KEY"],
-            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-        )
-
-        prompt = f"""
+    prompt = f"""
         You are a resume expert. Rewrite the following resume to be better tailored for this job.
 
         Job Description:
@@ -119,47 +93,108 @@ def enhanceResume(req: func.HttpRequest) -> func.HttpResponse:
         {resume_text}
         """
 
-        response = client.chat.completions.create(
-            model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
-            messages=[
-                {"role": "system", "content": "You are an AI resume optimization assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+    return [
+        {"role": "system", "content": "You are an AI resume optimization assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+def enhanced_resume_blob_name(resume_stream, job_description, required_skills):
+    # Same resume + job + skills + model + prompt => same document, so the blob name is derived from them
+    digest = hashlib.sha256()
+    for part in (
+        hashlib.sha256(resume_stream.getbuffer()).hexdigest(),
+        job_description,
+        required_skills if isinstance(required_skills, str) else json.dumps(required_skills, sort_keys=True),
+        os.environ["AZURE_OPENAI_DEPLOYMENT"],
+        ENHANCE_PROMPT_VERSION
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+
+    return f"{OUTPUT_FOLDER}/enhanced_resume_{digest.hexdigest()[:32]}.docx"
+
+def find_enhanced_resume(blob_service, output_blob_name):
+    try:
+        blob_service.get_blob_client(container=BLOB_CONTAINER_NAME, blob=output_blob_name).get_blob_properties()
+    except ResourceNotFoundError:
+        record_cache("enhanced_cv", misses=1)
+        return None
+
+    record_cache("enhanced_cv", hits=1)
+    logging.info(f"Reusing previously enhanced resume {output_blob_name}")
+    return get_blob_sas_url(blob_service, BLOB_CONTAINER_NAME, output_blob_name, expiry_minutes=60)
+
+@traced("blob.upload")
+def upload_enhanced_resume(blob_service, output_blob_name, enhanced_resume_text):
+    # Build the .docx in memory
+    enhanced_doc = io.BytesIO()
+    save_text_to_docx(enhanced_resume_text, enhanced_doc)
+    enhanced_doc.seek(0)
+    record_payload("enhanced_resume", enhanced_doc.getbuffer().nbytes)
+
+    output_blob_client = blob_service.get_blob_client(container=BLOB_CONTAINER_NAME, blob=output_blob_name)
+    output_blob_client.upload_blob(enhanced_doc, overwrite=True, max_concurrency=BLOB_TRANSFER_CONCURRENCY)
+
+    # Generate SAS URL
+    return get_blob_sas_url(blob_service, BLOB_CONTAINER_NAME, output_blob_name, expiry_minutes=60)
+
+def run_enhance_resume(job):
+    job_description = job.get("job_desc", "")
+    required_skills = job.get("req_skills", "")
+
+    blob_service = get_blob_service_client()
+    blob_name, resume_stream = read_latest_resume(
+        blob_service, BLOB_CONTAINER_NAME, RESUME_FOLDER,
+        lambda name: download_resume(blob_service, BLOB_CONTAINER_NAME, name)
+    )
+    output_blob_name = enhanced_resume_blob_name(resume_stream, job_description, required_skills)
+
+    def generate():
+        if not job.get("regenerate"):
+            download_url = find_enhanced_resume(blob_service, output_blob_name)
+            if download_url:
+                return {
+                    "message": "Enhanced resume uploaded successfully.",
+                    "download_url": download_url,
+                    "cached": True
+                }
+
+        resume_text = extract_text(resume_stream.getvalue(), blob_name)
+
+        # Call GPT-4o
+        with span("llm.enhance"):
+            response = chat_completion(enhance_messages(job_description, required_skills, resume_text))
+        record_usage(response.usage, "chat")
 
         enhanced_resume_text = response.choices[0].message.content.strip()
 
-        # Save as .docx
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as enhanced_doc:
-            save_text_to_docx(enhanced_resume_text, enhanced_doc.name)
-            enhanced_doc_path = enhanced_doc.name
+        return {
+            "message": "Enhanced resume uploaded successfully.",
+            "download_url": upload_enhanced_resume(blob_service, output_blob_name, enhanced_resume_text),
+            "cached": False
+        }
 
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        output_blob_name = f"{output_folder}/enhanced_resume_{timestamp}.docx"
-        output_blob_client = blob_service.get_blob_client(container=container_name, blob=output_blob_name)
+    # Identical concurrent requests (refresh/retry) share one generation
+    return _enhance_flights.do(output_blob_name, generate)
 
-        with open(enhanced_doc_path, "rb") as f:
-            output_blob_client.upload_blob(f, overwrite=True)
+@enhanceCV.route(route="enhanceCV", methods=["POST"])
+@instrument_route("enhanceResume")
+def enhanceResume(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Processing resume enhancement.')
 
-        os.remove(enhanced_doc_path)
+    try:
+        job = req.get_json()
+        job_description = job.get("job_desc", "")
+        required_skills = job.get("req_skills", "")
 
-        # Generate SAS URL
-        sas_url = generate_blob_sas(
-            account_name=blob_service.account_name,
-            container_name=container_name,
-            blob_name=output_blob_name,
-            account_key=blob_service.credential.account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(minutes=60)
-        )
+        if not job_description:
+            return func.HttpResponse("Job description is required.", status_code=400)
 
-        download_url = f"https://{blob_service.account_name}.blob.core.windows.net/{container_name}/{output_blob_name}?{sas_url}"
+        if wants_background_job(req):
+            return job_accepted_response(submit_job("enhanceCV", job))
 
         return func.HttpResponse(
-            json.dumps({
-                "message": "Enhanced resume uploaded successfully.",
-                "download_url": download_url
-            }),
+            json.dumps(run_enhance_resume(job)),
             mimetype="application/json",
             status_code=200
         )
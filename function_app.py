@@ -1,24 +1,51 @@
+import asyncio
 import logging
 import os
+import posixpath
 import tempfile
 import json
-from collections import defaultdict
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import VectorizedQuery
-from openai import AzureOpenAI
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
-from azure.core.credentials import AzureKeyCredential as DocumentKeyCredential
-
-from getAssignmentDetails import getAssignmentDetails
+from azure.core.exceptions import HttpResponseError
+
+from getAssignmentDetails import getAssignmentDetails, fetch_assignments
 from uploadToBlobStorage import uploadToBlobStorage
 from getFilesFromBlobStorage import getFilesFromBlobStorage
-from enhanceCV import enhanceCV
+from enhanceCV import enhanceCV, run_enhance_resume, download_resume
+from assignmentIngestion import assignmentIngestion, run_assignment_ingestion
+from jobQueue import (
+    JOB_QUEUE_NAME, register_job_handler, submit_job, get_job, process_job_message,
+    wants_background_job, job_accepted_response
+)
+from clientPool import (
+    get_blob_service_client, get_search_client,
+    get_async_blob_service_client, get_async_search_client, BLOB_TRANSFER_CONCURRENCY
+)
+from resumeCache import resume_cache_key, get_cached_resume, store_cached_resume
+from stageGraph import Stage, run_stage_graph
+from localVectorIndex import get_local_vector_index
+from textExtraction import extract_text, extract_text_async
+from resumeLocator import read_latest_resume, read_latest_resume_async
+from ranking import AGGREGATIONS, rank_jobs, fuse_result_lists
+from promptBuilder import prepare_resume_chunks
+from embeddingCache import embed_with_cache, embed_with_cache_async, embedding_options, EMBEDDING_DIMENSIONS
+from telemetry import instrument_route, span, traced, record_usage, record_payload, bind
+from resumeSchema import StructuredResume, RESUME_RESPONSE_FORMAT, RESUME_SCHEMA_DIGEST, merge_resumes
+from llmGateway import chat_completion, chat_completion_async, create_embeddings, create_embeddings_async
+
+# "remote" queries Azure Cognitive Search, "local" serves vector retrieval from the in-process index
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "remote")
+# Opt-in: the fallback keeps a full export of the index (vectors included) on every instance
+LOCAL_VECTOR_INDEX_FALLBACK = os.getenv("LOCAL_VECTOR_INDEX_FALLBACK", "false").lower() == "true"
+THROTTLED_STATUS_CODES = (429, 503)
+
+# Hybrid queries return at most 1000 results
+DEFAULT_MATCH_TOP = 30
+MAX_MATCH_TOP = 1000
+
+# Parallel parse calls per resume when it is split into chunks
+RESUME_PARSE_CONCURRENCY = int(os.getenv("RESUME_PARSE_CONCURRENCY", "4"))
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,243 +58,597 @@ app.register_functions(getAssignmentDetails)
 app.register_functions(uploadToBlobStorage)
 app.register_functions(getFilesFromBlobStorage)
 app.register_functions(enhanceCV)
+app.register_functions(assignmentIngestion)
 
-def extract_text_from_docx_with_layout_model(blob_url: str) -> str:
-    endpoint = os.environ["AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT"]
-    key = os.environ["AZURE_DOCUMENT_INTELLIGENCE_KEY"]
+# Bump when resume_parse_messages or the keyword derivation changes so cached profiles are rebuilt
+PROFILE_PROMPT_VERSION = "1"
 
-    client = DocumentIntelligenceClient(
-        endpoint=endpoint,
-        credential=DocumentKeyCredential(key)
+def resume_parse_messages(resume_text: str, part: int = 1, parts: int = 1) -> list:
+    system_prompt = (
+        "You are an expert resume parser. Convert plain resume text into structured JSON. "
+        "In search_keywords, give 15-20 relevant keywords drawn from the summary and skills for job search."
     )
+    if parts > 1:
+        system_prompt += (
+            f" You are given part {part} of {parts} of one resume. Extract only what appears"
+            " in this part and leave every other field empty."
+        )
+    user_prompt = f"""
+        Given the following resume text, extract its structured information.
 
-    poller = client.begin_analyze_document(
-        model_id="prebuilt-layout",
-        body=AnalyzeDocumentRequest(url_source=blob_url),
-        content_type="application/json"
+        Resume:
+        {resume_text}
+        """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def load_structured_resume(message) -> StructuredResume:
+    # The response format is schema-constrained, so the only failure left is a refusal
+    if getattr(message, "refusal", None):
+        raise ValueError(f"Resume parsing was refused: {message.refusal}")
+    return StructuredResume.from_json(message.content)
+
+def _parse_resume_chunk(chunk: str, part: int, parts: int) -> StructuredResume:
+    with span("llm.parse"):
+        response = chat_completion(
+            resume_parse_messages(chunk, part, parts),
+            response_format=RESUME_RESPONSE_FORMAT,
+            temperature=0.3
+        )
+    record_usage(response.usage, "chat")
+
+    return load_structured_resume(response.choices[0].message)
+
+def parse_resume_with_gpt(resume_text: str) -> StructuredResume:
+    chunks = prepare_resume_chunks(resume_text)
+    if len(chunks) == 1:
+        return _parse_resume_chunk(chunks[0], 1, 1)
+
+    # Long resumes: chunks parsed in parallel, then merged without another model call
+    with ThreadPoolExecutor(max_workers=min(len(chunks), RESUME_PARSE_CONCURRENCY)) as executor:
+        parts = list(executor.map(bind(_parse_resume_chunk), chunks, range(1, len(chunks) + 1), [len(chunks)] * len(chunks)))
+    return merge_resumes(parts)
+
+async def _parse_resume_chunk_async(chunk: str, part: int, parts: int) -> StructuredResume:
+    with span("llm.parse"):
+        response = await chat_completion_async(
+            resume_parse_messages(chunk, part, parts),
+            response_format=RESUME_RESPONSE_FORMAT,
+            temperature=0.3
+        )
+    record_usage(response.usage, "chat")
+
+    return load_structured_resume(response.choices[0].message)
+
+async def parse_resume_with_gpt_async(resume_text: str) -> StructuredResume:
+    chunks = await asyncio.to_thread(prepare_resume_chunks, resume_text)
+    if len(chunks) == 1:
+        return await _parse_resume_chunk_async(chunks[0], 1, 1)
+
+    semaphore = asyncio.Semaphore(RESUME_PARSE_CONCURRENCY)
+
+    async def parse_part(chunk, part):
+        async with semaphore:
+            return await _parse_resume_chunk_async(chunk, part, len(chunks))
+
+    parts = await asyncio.gather(*(parse_part(chunk, i) for i, chunk in enumerate(chunks, 1)))
+    return merge_resumes(parts)
+
+def analyze_resume(blob_service, container_name, blob_name) -> dict:
+    resume_stream = download_resume(blob_service, container_name, blob_name)
+
+    # Local parsers first; only scanned or unrecognised files go to the layout model
+    resume_text = extract_text(resume_stream.getvalue(), blob_name)
+
+    # One structured-output call returns the parsed resume and its search keywords
+    resume = parse_resume_with_gpt(resume_text)
+    search_keywords = resume.keyword_text()
+    logging.info(f"Search keywords extracted: {search_keywords}")
+
+    return {
+        "resume_text": resume_text,
+        "structured_resume": resume.to_dict(),
+        "search_keywords": search_keywords
+    }
+
+def _embed_uncached(texts) -> list:
+    # The embeddings API takes up to 2048 inputs per call
+    vectors = []
+    for i in range(0, len(texts), 2048):
+        with span("llm.embed"):
+            embed_response = create_embeddings(texts[i:i + 2048], **embedding_options())
+        record_usage(embed_response.usage, "embeddings")
+        vectors.extend(item.embedding for item in sorted(embed_response.data, key=lambda d: d.index))
+    return vectors
+
+def embed_texts(texts) -> list:
+    # Identical keyword strings are served from the local embedding cache
+    return embed_with_cache(texts, _embed_uncached)
+
+async def _embed_uncached_async(texts) -> list:
+    with span("llm.embed"):
+        response = await create_embeddings_async(texts, **embedding_options())
+    record_usage(response.usage, "embeddings")
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+def build_resume_profile(blob_service, container_name, blob_name) -> dict:
+    profile = analyze_resume(blob_service, container_name, blob_name)
+    profile["resume_vector"] = embed_texts([profile["search_keywords"]])[0]
+    return profile
+
+def profile_cache_key(blob_name, etag) -> str:
+    # An unchanged blob keeps its ETag, so repeat matches skip layout, GPT and embedding calls
+    return resume_cache_key(
+        blob_name,
+        etag,
+        None,
+        os.environ["AZURE_OPENAI_DEPLOYMENT"],
+        os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+        EMBEDDING_DIMENSIONS,
+        PROFILE_PROMPT_VERSION,
+        RESUME_SCHEMA_DIGEST
     )
 
-    result = poller.result()
-    lines = []
-
-    for page in result.pages:
-        if page.lines:
-            for line in page.lines:
-                text = line.content.strip()
-                if text:
-                    lines.append(text)
-
-    if result.tables:
-        for table in result.tables:
-            for cell in table.cells:
-                text = cell.content.strip()
-                if text:
-                    lines.append(text)
-
-    full_text = "\n".join(lines)
-    return full_text
-
-def get_latest_resume_from_folder(blob_service_client, container_name, folder_prefix):
-    container_client = blob_service_client.get_container_client(container_name)
-    blobs = list(container_client.list_blobs(name_starts_with=folder_prefix))
-
-    if not blobs:
-        raise FileNotFoundError(f"No files found in folder: {folder_prefix}")
-
-    latest_blob = max(blobs, key=lambda b: b.last_modified)
-    return latest_blob.name
-
-def generate_blob_sas_url(blob_service_client, container, blob_name):
-    blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
-
-    sas_token = generate_blob_sas(
-        account_name=blob_service_client.account_name,
-        container_name=container,
-        blob_name=blob_name,
-        account_key=os.environ["AZURE_BLOB_KEY"],
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(minutes=15)
+@traced("blob.properties")
+def resume_profile_cache_key(blob_service, container_name, blob_name) -> str:
+    blob_client = blob_service.get_blob_client(container=container_name, blob=blob_name)
+    return profile_cache_key(blob_name, blob_client.get_blob_properties().etag)
+
+def get_resume_profile(blob_service, container_name, blob_name) -> dict:
+    cache_key = resume_profile_cache_key(blob_service, container_name, blob_name)
+
+    profile = get_cached_resume(cache_key)
+    if profile:
+        logging.info(f"Resume cache hit for {blob_name}")
+        return profile
+
+    logging.info(f"Resume cache miss for {blob_name}")
+    profile = build_resume_profile(blob_service, container_name, blob_name)
+    store_cached_resume(cache_key, **profile)
+    return profile
+
+def attach_assignment_details(final_jobs) -> list:
+    # One batched dbo.assignmentList query for all matches instead of a details call per card
+    details = fetch_assignments([job["id"] for job in final_jobs])
+    for job in final_jobs:
+        job["details"] = details.get(str(job["id"]))
+    return final_jobs
+
+def wants_details(params) -> bool:
+    return str(params.get("include_details", "")).lower() == "true"
+
+SEMANTIC_SEARCH_OPTIONS = {
+    "query_type": "semantic",
+    "semantic_configuration_name": "gtfy-semantic-config",
+    "query_caption": "extractive",
+    "query_answer": "extractive",
+    "highlight_fields": "req_skills, key_responsibilities, job_desc",
+    "select": ["id", "title", "company", "location", "type", "gtd_id", "req_skills", "key_responsibilities"]
+}
+
+def get_match_options(params) -> dict:
+    engine = params.get("engine", SEARCH_ENGINE).lower()
+    if engine not in ("remote", "local"):
+        raise ValueError(f"Unknown search engine: {engine}")
+
+    aggregation = params.get("aggregation", "max")
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {aggregation}")
+
+    top = min(max(int(params.get("top", DEFAULT_MATCH_TOP)), 1), MAX_MATCH_TOP)
+    top_n = max(int(params.get("top_n", 3)), 1)
+
+    return {"engine": engine, "aggregation": aggregation, "top": top, "top_n": top_n}
+
+def build_vector_query(resume_vector, top=DEFAULT_MATCH_TOP):
+    from azure.search.documents.models import VectorizedQuery
+
+    return VectorizedQuery(
+        kind="vector",
+        vector=resume_vector,
+        fields="embedding",
+        k_nearest_neighbors=max(50, top),
+        profile="gtfy-vector-profile"
     )
 
-    return f"{blob_client.url}?{sas_token}"
+@traced("search.local")
+def search_local_index(vector_query, top=DEFAULT_MATCH_TOP, sync=True) -> list:
+    return get_local_vector_index().search(vector_queries=[vector_query], top=top, sync=sync)
 
-def parse_resume_with_gpt(resume_text: str) -> dict:
-    client = AzureOpenAI(
-        api_key=os.environ["AZURE_OPENAI_KEY"],
-        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-    )
+def keep_fallback_index_warm():
+    # The fallback never syncs on the request path, a background refresh keeps its copy current
+    if LOCAL_VECTOR_INDEX_FALLBACK:
+        get_local_vector_index().start_refresher()
 
-    system_prompt = "You are an expert resume parser. Convert plain resume text into structured JSON."
-    user_prompt = f"""
-        Given the following resume text, extract structured information with this format:
-
-        {{
-        "full_name": "",
-        "location": "",
-        "summary": "",
-        "skills": [],
-        "certifications": [],
-        "work_experience": [
-            {{
-            "company": "",
-            "title": "",
-            "start_date": "",
-            "end_date": "",
-            "responsibilities": ""
-            }}
-        ],
-        "education": "",
-        "languages": [],
-        "publications": []
-        }}
+def search_local_fallback(vector_query, top, error) -> list:
+    logging.warning(f"Search service returned {error.status_code}; falling back to the local vector index.")
+    try:
+        return search_local_index(vector_query, top, sync=False)
+    except Exception as local_error:
+        logging.warning(f"Local vector index unavailable for the fallback: {local_error}")
+        raise error
 
-        Resume:
-        {resume_text}
-        """
+@traced("search")
+def search_assignments(search_text, vector_query, engine="remote", top=DEFAULT_MATCH_TOP) -> list:
+    if engine == "local":
+        return search_local_index(vector_query, top)
 
-    response = client.chat.completions.create(
-        model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.3
+    keep_fallback_index_warm()
+    try:
+        return list(get_search_client().search(
+            search_text=search_text,
+            vector_queries=[vector_query],
+            top=top,
+            **SEMANTIC_SEARCH_OPTIONS
+        ))
+    except HttpResponseError as e:
+        if LOCAL_VECTOR_INDEX_FALLBACK and e.status_code in THROTTLED_STATUS_CODES:
+            return search_local_fallback(vector_query, top, e)
+        raise
+
+def run_assignments_match(params) -> dict:
+    container_name = "gtfydemo"
+    folder_prefix = "resume/"
+    match_options = get_match_options(params)
+
+    blob_service = get_blob_service_client()
+    _, profile = read_latest_resume(
+        blob_service, container_name, folder_prefix,
+        lambda name: get_resume_profile(blob_service, container_name, name)
     )
+    search_keywords = profile["search_keywords"]
+    resume_vector = profile["resume_vector"]
 
-    output = response.choices[0].message.content.strip()
+    vector_query = build_vector_query(resume_vector, match_options["top"])
+    results = search_assignments(search_keywords, vector_query, match_options["engine"], match_options["top"])
 
-    try:
-        return json.loads(output)
-    except json.JSONDecodeError:
-        logging.warning("GPT returned unparseable JSON. Returning raw text.")
-        return {"raw_output": output}
+    final_jobs = rank_jobs(results, match_options["aggregation"], match_options["top_n"])
+    if wants_details(params):
+        attach_assignment_details(final_jobs)
+
+    return {"matched_jobs": final_jobs}
 
 @app.route(route="assignmentsMatch")
+@instrument_route("assignmentsMatch")
 def assignmentsMatch(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Processing resume for hybrid matching...")
 
     try:
-        container_name = "gtfydemo"
-        folder_prefix = "resume/"
+        if wants_background_job(req):
+            return job_accepted_response(submit_job("assignmentsMatch", dict(req.params)))
 
-        blob_service = BlobServiceClient.from_connection_string(os.environ["AZURE_BLOB_CONN"])
-        blob_name = get_latest_resume_from_folder(blob_service, container_name, folder_prefix)
-        blob_url = generate_blob_sas_url(blob_service, container_name, blob_name)
+        return func.HttpResponse(
+            json.dumps(run_assignments_match(req.params), indent=2, default=str),
+            mimetype="application/json",
+            status_code=200
+        )
 
-        resume_text = extract_text_from_docx_with_layout_model(blob_url)
-        structured_resume = parse_resume_with_gpt(resume_text)
+    except Exception as e:
+        logging.exception("Error occurred during job matching.")
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
 
-        if "raw_output" in structured_resume:
-            raw_output = structured_resume["raw_output"]
+async def _stage_resume_blob(args):
+    blob_service = get_async_blob_service_client()
 
-            if raw_output.strip().startswith("```"):
-                raw_output = raw_output.strip().strip("`").strip("json").strip()
+    async def read_properties(blob_name):
+        return await blob_service.get_blob_client(container=args["container_name"], blob=blob_name).get_blob_properties()
 
-            try:
-                structured_resume = json.loads(raw_output)
-            except json.JSONDecodeError:
-                logging.warning("Failed to parse JSON from raw_output.")
-                structured_resume = {}
-
-        summary = structured_resume.get("summary", "")
-        skills = structured_resume.get("skills", [])
-
-        client = AzureOpenAI(
-            api_key=os.environ["AZURE_OPENAI_KEY"],
-            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-        )
+    blob_name, properties = await read_latest_resume_async(
+        blob_service, args["container_name"], args["folder_prefix"], read_properties
+    )
+    return {"name": blob_name, "etag": properties.etag}
 
-        # Extract keywords from summary and skills via GPT
-        keyword_response = client.chat.completions.create(
-            model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
-            messages=[
-                {"role": "system", "content": "Extract 15-20 relevant keywords from the following text for search purposes. Return them as a comma-separated list."},
-                {"role": "user", "content": f"Summary:\n{summary}\nSkills:\n{', '.join(skills)}"}
-            ],
-            temperature=0.3
-        )
+async def _stage_cache_lookup(args):
+    cache_key = profile_cache_key(args["resume_blob"]["name"], args["resume_blob"]["etag"])
+    profile = await asyncio.to_thread(get_cached_resume, cache_key)
+    logging.info(f"Resume cache {'hit' if profile else 'miss'} for {args['resume_blob']['name']}")
+    return {"cache_key": cache_key, "profile": profile}
 
-        search_keywords = keyword_response.choices[0].message.content.strip()
-        logging.info(f"Search keywords extracted: {search_keywords}")
+async def _stage_resume_bytes(args):
+    if args["cache_lookup"]["profile"]:
+        return None
 
-        embed_response = client.embeddings.create(
-            input=[search_keywords],
-            model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
-        )
-        resume_vector = embed_response.data[0].embedding
+    blob_client = get_async_blob_service_client().get_blob_client(
+        container=args["container_name"], blob=args["resume_blob"]["name"]
+    )
+    with span("blob.download"):
+        downloader = await blob_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY)
+        data = await downloader.readall()
+    record_payload("resume", len(data))
+    return data
+
+async def _stage_resume_text(args):
+    cached = args["cache_lookup"]["profile"]
+    if cached:
+        return cached["resume_text"]
+    return await extract_text_async(args["resume_bytes"], args["resume_blob"]["name"])
+
+async def _stage_parsed_resume(args):
+    if args["cache_lookup"]["profile"]:
+        return None
+    return await parse_resume_with_gpt_async(args["resume_text"])
+
+async def _stage_structured_resume(args):
+    cached = args["cache_lookup"]["profile"]
+    if cached:
+        return cached["structured_resume"]
+    return args["parsed_resume"].to_dict()
+
+async def _stage_search_keywords(args):
+    cached = args["cache_lookup"]["profile"]
+    if cached:
+        return cached["search_keywords"]
+
+    search_keywords = args["parsed_resume"].keyword_text()
+    logging.info(f"Search keywords extracted: {search_keywords}")
+    return search_keywords
+
+async def _stage_resume_vector(args):
+    cached = args["cache_lookup"]["profile"]
+    if cached:
+        return cached["resume_vector"]
+
+    vectors = await embed_with_cache_async([args["search_keywords"]], _embed_uncached_async)
+    return vectors[0]
+
+async def _stage_bm25_results(args):
+    match_options = args["match_options"]
+    if match_options["engine"] == "local":
+        return []
 
-        search_client = SearchClient(
-            endpoint=os.environ["SEARCH_ENDPOINT"],
-            index_name=os.environ["SEARCH_INDEX"],
-            credential=AzureKeyCredential(os.environ["SEARCH_KEY"])
+    try:
+        results = await get_async_search_client().search(
+            search_text=args["search_keywords"],
+            top=match_options["top"],
+            **SEMANTIC_SEARCH_OPTIONS
         )
+        return [doc async for doc in results]
+    except HttpResponseError as e:
+        if LOCAL_VECTOR_INDEX_FALLBACK and e.status_code in THROTTLED_STATUS_CODES:
+            logging.warning(f"Search service returned {e.status_code}; matching on vectors only.")
+            return []
+        raise
 
-        vector_query = VectorizedQuery(
-            kind="vector",
-            vector=resume_vector,
-            fields="embedding",
-            k_nearest_neighbors=50,
-            profile="gtfy-vector-profile"
-        )
+async def _stage_vector_results(args):
+    match_options = args["match_options"]
+    vector_query = build_vector_query(args["resume_vector"], match_options["top"])
+
+    if match_options["engine"] == "local":
+        return await asyncio.to_thread(search_local_index, vector_query, match_options["top"])
 
-        results = list(search_client.search(
-            search_text=search_keywords,
+    keep_fallback_index_warm()
+    try:
+        results = await get_async_search_client().search(
+            search_text=None,
             vector_queries=[vector_query],
-            query_type="semantic",
-            semantic_configuration_name="gtfy-semantic-config",
-            query_caption="extractive",
-            query_answer="extractive",
-            highlight_fields="req_skills, key_responsibilities, job_desc",
-            select=["id", "title", "company", "location", "type", "gtd_id", "req_skills", "key_responsibilities"],
-            top=30
-        ))
+            select=SEMANTIC_SEARCH_OPTIONS["select"],
+            top=match_options["top"]
+        )
+        return [doc async for doc in results]
+    except HttpResponseError as e:
+        if LOCAL_VECTOR_INDEX_FALLBACK and e.status_code in THROTTLED_STATUS_CODES:
+            return await asyncio.to_thread(search_local_fallback, vector_query, match_options["top"], e)
+        raise
+
+async def _stage_matched_jobs(args):
+    match_options = args["match_options"]
+    fused = fuse_result_lists([args["bm25_results"], args["vector_results"]])
+    return rank_jobs(fused[:match_options["top"]], match_options["aggregation"], match_options["top_n"])
+
+ASYNC_MATCH_STAGES = [
+    Stage("resume_blob", _stage_resume_blob, ["container_name", "folder_prefix"]),
+    Stage("cache_lookup", _stage_cache_lookup, ["resume_blob"]),
+    Stage("resume_bytes", _stage_resume_bytes, ["container_name", "resume_blob", "cache_lookup"]),
+    Stage("resume_text", _stage_resume_text, ["cache_lookup", "resume_blob", "resume_bytes"]),
+    Stage("parsed_resume", _stage_parsed_resume, ["cache_lookup", "resume_text"]),
+    Stage("structured_resume", _stage_structured_resume, ["cache_lookup", "parsed_resume"]),
+    Stage("search_keywords", _stage_search_keywords, ["cache_lookup", "parsed_resume"]),
+    Stage("resume_vector", _stage_resume_vector, ["cache_lookup", "search_keywords"]),
+    Stage("bm25_results", _stage_bm25_results, ["match_options", "search_keywords"]),
+    Stage("vector_results", _stage_vector_results, ["match_options", "resume_vector"]),
+    Stage("matched_jobs", _stage_matched_jobs, ["match_options", "bm25_results", "vector_results"]),
+]
+
+@app.route(route="assignmentsMatchAsync")
+@instrument_route("assignmentsMatchAsync")
+async def assignmentsMatchAsync(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info("Processing resume for concurrent hybrid matching...")
 
-        global_max_score = max((doc["@search.score"] for doc in results), default=1.0)
-        job_map = defaultdict(list)
-        for doc in results:
-            job_id = doc.get("gtd_id") or doc["id"].split("_")[0]
-            job_map[job_id].append(doc)
-
-        final_jobs = []
-        for job_id, chunks in job_map.items():
-            chunks.sort(key=lambda d: d["@search.score"], reverse=True)
-            top_doc = chunks[0]
-            match_percent = int((top_doc["@search.score"] / global_max_score) * 100)
-
-            highlightedSkills = []
-            for doc in chunks:
-                highlights = doc.get("@search.highlights")
-                if highlights:
-                    highlightedSkills.extend(highlights.get("req_skills", []))
-                    highlightedSkills.extend(highlights.get("key_responsibilities", []))
-                    highlightedSkills.extend(highlights.get("job_desc", []))
-            highlightedSkills = list(set(highlightedSkills))
-
-            final_jobs.append({
-                "id": job_id,
-                "title": top_doc.get("title", ""),
-                "company": top_doc.get("company", ""),
-                "location": top_doc.get("location", ""),
-                "type": top_doc.get("type", ""),
-                "req_skills": top_doc.get("req_skills"),
-                "key_responsibilities": top_doc.get("key_responsibilities"),
-                "matchPercent": match_percent,
-                "highlightedSkills": highlightedSkills,
-                "matchedChunkCount": len(chunks)
-            })
-
-        final_jobs.sort(key=lambda j: j["matchPercent"], reverse=True)
+    try:
+        results = await run_stage_graph(ASYNC_MATCH_STAGES, {
+            "container_name": "gtfydemo",
+            "folder_prefix": "resume/",
+            "match_options": get_match_options(req.params)
+        })
+
+        cache_lookup = results["cache_lookup"]
+        if not cache_lookup["profile"]:
+            await asyncio.to_thread(
+                store_cached_resume,
+                cache_lookup["cache_key"],
+                results["resume_text"],
+                results["structured_resume"],
+                results["search_keywords"],
+                results["resume_vector"]
+            )
+
+        final_jobs = results["matched_jobs"]
+        if wants_details(req.params):
+            await asyncio.to_thread(attach_assignment_details, final_jobs)
 
         return func.HttpResponse(
             json.dumps({
                 "matched_jobs": final_jobs
-            }, indent=2),
+            }, indent=2, default=str),
             mimetype="application/json",
             status_code=200
         )
 
     except Exception as e:
-        logging.exception("Error occurred during job matching.")
+        logging.exception("Error occurred during concurrent job matching.")
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
+
+# Bulk matching: bounded parallel extraction/parsing, one embeddings call for all resumes
+BATCH_MATCH_CONCURRENCY = int(os.getenv("BATCH_MATCH_CONCURRENCY", "8"))
+BATCH_MATCH_MAX_RESUMES = int(os.getenv("BATCH_MATCH_MAX_RESUMES", "500"))
+# Inline requests must finish inside the HTTP trigger's ~230 s limit; larger batches go through ?async=true
+BATCH_MATCH_MAX_INLINE_RESUMES = int(os.getenv("BATCH_MATCH_MAX_INLINE_RESUMES", "16"))
+
+BATCH_RESUME_PREFIX = "resume/"
+
+def is_batch_resume_name(blob_name) -> bool:
+    # Callers name the blobs, so only plain paths under the resume folder are read
+    # (no "..", "./", "//" or backslashes that could reach jobs/, manifests/ etc.)
+    return (
+        isinstance(blob_name, str)
+        and blob_name.startswith(BATCH_RESUME_PREFIX)
+        and len(blob_name) > len(BATCH_RESUME_PREFIX)
+        and "\\" not in blob_name
+        and posixpath.normpath(blob_name) == blob_name
+    )
+
+def _prepare_batch_resume(blob_service, container_name, blob_name) -> dict:
+    cache_key = resume_profile_cache_key(blob_service, container_name, blob_name)
+    profile = get_cached_resume(cache_key)
+    if profile:
+        logging.info(f"Resume cache hit for {blob_name}")
+        return {"cache_key": cache_key, "profile": profile, "cached": True}
+
+    return {"cache_key": cache_key, "profile": analyze_resume(blob_service, container_name, blob_name), "cached": False}
+
+def _match_batch_resume(blob_name, profile, match_options, include_details) -> dict:
+    vector_query = build_vector_query(profile["resume_vector"], match_options["top"])
+    results = search_assignments(profile["search_keywords"], vector_query, match_options["engine"], match_options["top"])
+
+    final_jobs = rank_jobs(results, match_options["aggregation"], match_options["top_n"])
+    if include_details:
+        attach_assignment_details(final_jobs)
+
+    return {"resume": blob_name, "matched_jobs": final_jobs}
+
+def iter_batch_matches(blob_names, match_options, include_details=False):
+    container_name = "gtfydemo"
+    blob_service = get_blob_service_client()
+
+    with ThreadPoolExecutor(max_workers=BATCH_MATCH_CONCURRENCY) as executor:
+        prepared = {}
+        futures = {
+            executor.submit(bind(_prepare_batch_resume), blob_service, container_name, blob_name): blob_name
+            for blob_name in blob_names
+        }
+        for future in as_completed(futures):
+            blob_name = futures[future]
+            try:
+                prepared[blob_name] = future.result()
+            except Exception as e:
+                logging.exception(f"Failed to prepare resume {blob_name}")
+                yield {"resume": blob_name, "error": str(e)}
+
+        # One embeddings round-trip for every resume that missed the cache
+        pending = [blob_name for blob_name, entry in prepared.items() if not entry["cached"]]
+        if pending:
+            try:
+                vectors = embed_texts([prepared[blob_name]["profile"]["search_keywords"] for blob_name in pending])
+            except Exception as e:
+                logging.exception("Batch embedding request failed.")
+                for blob_name in pending:
+                    del prepared[blob_name]
+                    yield {"resume": blob_name, "error": str(e)}
+            else:
+                for blob_name, vector in zip(pending, vectors):
+                    entry = prepared[blob_name]
+                    entry["profile"]["resume_vector"] = vector
+                    store_cached_resume(entry["cache_key"], **entry["profile"])
+
+        futures = {
+            executor.submit(bind(_match_batch_resume), blob_name, entry["profile"], match_options, include_details): blob_name
+            for blob_name, entry in prepared.items()
+        }
+        for future in as_completed(futures):
+            blob_name = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                logging.exception(f"Failed to match resume {blob_name}")
+                yield {"resume": blob_name, "error": str(e)}
+
+def run_batch_match(payload) -> dict:
+    params = payload.get("params", {})
+    results = list(iter_batch_matches(payload["resumes"], get_match_options(params), wants_details(params)))
+    return {"results": results}
+
+@app.route(route="assignmentsMatchBatch", methods=["POST"])
+@instrument_route("assignmentsMatchBatch")
+def assignmentsMatchBatch(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info("Processing bulk resume matching...")
+
+    try:
+        body = req.get_json()
+        resumes = body.get("resumes")
+
+        if not resumes or not isinstance(resumes, list):
+            return func.HttpResponse("A non-empty 'resumes' list of blob names is required.", status_code=400)
+
+        invalid = [blob_name for blob_name in resumes if not is_batch_resume_name(blob_name)]
+        if invalid:
+            return func.HttpResponse(
+                f"Resumes must be blob names under '{BATCH_RESUME_PREFIX}': {', '.join(map(str, invalid[:10]))}",
+                status_code=400
+            )
+
+        blob_names = list(dict.fromkeys(resumes))
+        if len(blob_names) > BATCH_MATCH_MAX_RESUMES:
+            return func.HttpResponse(f"At most {BATCH_MATCH_MAX_RESUMES} resumes per request.", status_code=400)
+
+        if wants_background_job(req):
+            return job_accepted_response(submit_job("assignmentsMatchBatch", {"resumes": blob_names, "params": dict(req.params)}))
+
+        if len(blob_names) > BATCH_MATCH_MAX_INLINE_RESUMES:
+            return func.HttpResponse(
+                f"At most {BATCH_MATCH_MAX_INLINE_RESUMES} resumes per inline request; use ?async=true for larger batches.",
+                status_code=400
+            )
+
+        # One buffered JSON response with an entry per resume, in completion order;
+        # the same shape as the async job's result
+        return func.HttpResponse(
+            json.dumps(run_batch_match({"resumes": blob_names, "params": dict(req.params)}), default=str),
+            mimetype="application/json",
+            status_code=200
+        )
+
+    except Exception as e:
+        logging.exception("Error occurred during bulk job matching.")
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
+
+# Background jobs: ?async=true on the AI-heavy routes enqueues instead of running inline
+register_job_handler("assignmentsMatch", run_assignments_match)
+register_job_handler("assignmentsMatchBatch", run_batch_match)
+register_job_handler("enhanceCV", run_enhance_resume)
+register_job_handler("ingestAssignments", run_assignment_ingestion)
+
+@app.queue_trigger(arg_name="msg", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+def processJob(msg: func.QueueMessage) -> None:
+    logging.info(f"Processing background job message {msg.id}")
+    process_job_message(msg.get_body().decode("utf-8"), msg.dequeue_count or 1)
+
+@app.route(route="jobStatus", methods=["GET"])
+@instrument_route("jobStatus")
+def jobStatus(req: func.HttpRequest) -> func.HttpResponse:
+    job_id = req.params.get("job_id")
+    if not job_id:
+        return func.HttpResponse("Missing job_id parameter", status_code=400)
+
+    try:
+        job = get_job(job_id)
+        if not job:
+            return func.HttpResponse(f"No job found with id {job_id}", status_code=404)
+
+        return func.HttpResponse(json.dumps(job, default=str), mimetype="application/json", status_code=200)
+
+    except Exception as e:
+        logging.exception("Error reading job status.")
         return func.HttpResponse(f"Error: {str(e)}", status_code=500)
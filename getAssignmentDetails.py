@@ -1,65 +1,135 @@
-# Register this blueprint by adding the following line of code 
-# to your entry point file.  
-# app.register_functions(getAssignmentDetails) 
-# 
+# Register this blueprint by adding the following line of code
+# to your entry point file.
+# app.register_functions(getAssignmentDetails)
+#
 # Please refer to https://aka.ms/azure-functions-python-blueprints
 
 
 import azure.functions as func
-import pyodbc
 import os
 import logging
 import json
-from azure.identity import DefaultAzureCredential
+import threading
+import time
+from collections import OrderedDict
+
+from clientPool import sql_connection
+from telemetry import instrument_route, record_cache, span
 
 getAssignmentDetails = func.Blueprint()
 
+# In-memory LRU of assignment rows, shared by all invocations on this worker
+ASSIGNMENT_CACHE_TTL_SECONDS = int(os.getenv("ASSIGNMENT_CACHE_TTL_SECONDS", "300"))
+ASSIGNMENT_CACHE_MAX_ENTRIES = int(os.getenv("ASSIGNMENT_CACHE_MAX_ENTRIES", "5000"))
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_IDS_PER_QUERY = 1000
+
+_assignment_cache = OrderedDict()
+_assignment_cache_lock = threading.Lock()
+
+
+def _get_cached_assignments(job_ids):
+    found = {}
+    now = time.monotonic()
+
+    with _assignment_cache_lock:
+        for job_id in job_ids:
+            entry = _assignment_cache.get(job_id)
+            if entry is None:
+                continue
+            if now - entry[0] > ASSIGNMENT_CACHE_TTL_SECONDS:
+                del _assignment_cache[job_id]
+                continue
+            _assignment_cache.move_to_end(job_id)
+            found[job_id] = entry[1]
+
+    return found
+
+
+def _cache_assignments(rows):
+    now = time.monotonic()
+
+    with _assignment_cache_lock:
+        for job_id, row in rows.items():
+            _assignment_cache[job_id] = (now, row)
+            _assignment_cache.move_to_end(job_id)
+        while len(_assignment_cache) > ASSIGNMENT_CACHE_MAX_ENTRIES:
+            _assignment_cache.popitem(last=False)
+
+
+def invalidate_assignments(job_ids=None):
+    with _assignment_cache_lock:
+        if job_ids is None:
+            _assignment_cache.clear()
+        else:
+            for job_id in job_ids:
+                _assignment_cache.pop(str(job_id), None)
+
+
+def fetch_assignments(job_ids):
+    # Returns {job_id: row} for the ids that exist; cache misses are loaded
+    # with one parameterized IN (...) query per MAX_IDS_PER_QUERY ids.
+    job_ids = list(dict.fromkeys(str(job_id) for job_id in job_ids if job_id))
+    found = _get_cached_assignments(job_ids)
+    missing = [job_id for job_id in job_ids if job_id not in found]
+    record_cache("assignment", hits=len(found), misses=len(missing))
+
+    if missing:
+        loaded = {}
+        with span("sql.assignments"), sql_connection() as conn:
+            cursor = conn.cursor()
+
+            for i in range(0, len(missing), MAX_IDS_PER_QUERY):
+                batch = missing[i:i + MAX_IDS_PER_QUERY]
+                placeholders = ", ".join("?" for _ in batch)
+
+                # Parameterized query
+                cursor.execute(f"SELECT * FROM dbo.assignmentList WHERE id IN ({placeholders})", *batch)
+                columns = [column[0] for column in cursor.description]
+                for row in cursor.fetchall():
+                    result = dict(zip(columns, row))
+                    loaded[str(result["id"])] = result
+
+        _cache_assignments(loaded)
+        found.update(loaded)
+
+    return {job_id: dict(found[job_id]) for job_id in job_ids if job_id in found}
+
 
 @getAssignmentDetails.route(route="getAssignmentDetails")
+@instrument_route("getAssignmentDetailsById")
 def getAssignmentDetailsById(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing request to fetch assignment by job ID')
 
     try:
+        # Batch mode: job_ids=a,b,c
+        job_ids = req.params.get('job_ids')
+        if job_ids:
+            job_ids = [job_id.strip() for job_id in job_ids.split(",") if job_id.strip()]
+            assignments = fetch_assignments(job_ids)
+
+            return func.HttpResponse(
+                json.dumps({
+                    "assignments": [assignments[job_id] for job_id in job_ids if job_id in assignments],
+                    "not_found": [job_id for job_id in job_ids if job_id not in assignments]
+                }, default=str),
+                status_code=200,
+                mimetype="application/json"
+            )
+
         # Get job_id from query string
         job_id = req.params.get('job_id')
         if not job_id:
             return func.HttpResponse("Missing job_id parameter", status_code=400)
 
-        # Environment vars
-        server = os.getenv('DB_SERVER')
-        database = os.getenv('DB_NAME')
-        driver = '{ODBC Driver 18 for SQL Server}'
-
-        # Get access token for Azure SQL
-        credential = DefaultAzureCredential()
-        token = credential.get_token("https://database.windows.net/.default")
-        access_token = token.token.encode('utf-16-le')
-
-        # Connect
-        conn_str = (
-            f'DRIVER={driver};'
-            f'SERVER={server};'
-            f'DATABASE={database};'
-            f'Encrypt=yes;'
-            f'TrustServerCertificate=yes;'
-            f'Authentication=ActiveDirectoryMSI'
-        )
-        conn = pyodbc.connect(conn_str)
-        cursor = conn.cursor()
-
-        # Parameterized query
-        cursor.execute("SELECT * FROM dbo.assignmentList WHERE id = ?", job_id)
-        row = cursor.fetchone()
-        conn.close()
-
-        if not row:
-            return func.HttpResponse(f"No assignment found with id {job_id}", status_code=404)
+        result = fetch_assignments([job_id]).get(job_id)
 
-        columns = [column[0] for column in cursor.description]
-        result = dict(zip(columns, row))
+        if not result:
+            return func.HttpResponse(f"No assignment found with id {job_id}", status_code=404)
 
         return func.HttpResponse(json.dumps(result, default=str), status_code=200, mimetype="application/json")
 
     except Exception as e:
         logging.error(f"Error: {str(e)}")
-        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
\ No newline at end of file
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
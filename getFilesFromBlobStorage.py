@@ -1,43 +1,51 @@
 import azure.functions as func
 import logging
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-import os
 import json
-from datetime import datetime, timedelta
 import ntpath
 
+from clientPool import get_blob_service_client
+from sasService import get_blob_sas_url
+from telemetry import instrument_route, span
+
 getFilesFromBlobStorage = func.Blueprint()
 
-# Environment or hardcoded configuration
-BLOB_CONNECTION_STRING = os.getenv("AZURE_BLOB_CONN")
+# Container and folder the resumes are listed from
 BLOB_CONTAINER_NAME = "gtfydemo"
 BLOB_FOLDER_PATH = "resume"  # e.g., "uploads", "resumes", etc.
 
 # SAS link expiry in minutes
 SAS_EXPIRY_MINUTES = 60
 
+# Listing page size; only the blobs on the returned page are signed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 @getFilesFromBlobStorage.route(route="getFilesFromBlobStorage", methods=["GET"])
+@instrument_route("getResumesFromBlobStorage")
 def getResumesFromBlobStorage(req: func.HttpRequest) -> func.HttpResponse:
     logging.info(f'Listing files from folder: {BLOB_FOLDER_PATH}')
 
     try:
+        try:
+            page_size = min(max(int(req.params.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return func.HttpResponse("page_size must be an integer.", status_code=400)
+        continuation_token = req.params.get('continuation_token') or None
+
         prefix = f"{BLOB_FOLDER_PATH}/"
-        blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+        blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client(BLOB_CONTAINER_NAME)
 
+        pages = container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size).by_page(
+            continuation_token=continuation_token
+        )
+        with span("blob.list"):
+            page = next(pages, [])
+
         files = []
-        for blob in container_client.list_blobs(name_starts_with=prefix):
+        for blob in page:
             filename = ntpath.basename(blob.name)
-
-            sas_token = generate_blob_sas(
-                account_name=blob_service_client.account_name,
-                container_name=BLOB_CONTAINER_NAME,
-                blob_name=blob.name,
-                account_key=blob_service_client.credential.account_key,
-                permission=BlobSasPermissions(read=True),
-                expiry=datetime.utcnow() + timedelta(minutes=SAS_EXPIRY_MINUTES)
-            )
-            download_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{BLOB_CONTAINER_NAME}/{blob.name}?{sas_token}"
+            download_url = get_blob_sas_url(blob_service_client, BLOB_CONTAINER_NAME, blob.name, expiry_minutes=SAS_EXPIRY_MINUTES)
 
             files.append({
                 "name": filename,
@@ -47,7 +55,7 @@ def getResumesFromBlobStorage(req: func.HttpRequest) -> func.HttpResponse:
             })
 
         return func.HttpResponse(
-            json.dumps({"files": files}, indent=2),
+            json.dumps({"files": files, "continuation_token": pages.continuation_token}),
             mimetype="application/json",
             status_code=200
         )
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import azure.functions as func
+from azure.core.exceptions import ResourceNotFoundError
+
+from clientPool import get_blob_service_client, get_queue_client
+
+# Background jobs for the AI-heavy routes. "storage" enqueues to an Azure Storage
+# queue drained by the processJob queue trigger and keeps job records as blobs;
+# "sqlite" is a single-process stand-in for local runs and tests.
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "storage")
+JOB_QUEUE_NAME = "gtfy-jobs"
+JOB_CONTAINER_NAME = "gtfydemo"
+JOB_FOLDER = "jobs"
+JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "gtfy_jobs.sqlite3"))
+
+# Transient failures are handed back to the queue, which redelivers the message until
+# maxDequeueCount (host.json) and then moves it to the poison queue; keep the two in step
+JOB_MAX_DEQUEUE_COUNT = int(os.getenv("JOB_MAX_DEQUEUE_COUNT", "5"))
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+_handlers = {}
+
+
+def register_job_handler(kind, handler):
+    _handlers[kind] = handler
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StorageJobBackend:
+    def _record_client(self, job_id):
+        return get_blob_service_client().get_blob_client(container=JOB_CONTAINER_NAME, blob=f"{JOB_FOLDER}/{job_id}.json")
+
+    def save(self, record):
+        from azure.storage.blob import ContentSettings
+
+        self._record_client(record["job_id"]).upload_blob(
+            json.dumps(record, default=str),
+            overwrite=True,
+            content_settings=ContentSettings(content_type="application/json")
+        )
+
+    def load(self, job_id):
+        try:
+            return json.loads(self._record_client(job_id).download_blob().readall())
+        except ResourceNotFoundError:
+            return None
+
+    def enqueue(self, message):
+        get_queue_client(JOB_QUEUE_NAME).send_message(message)
+
+
+class SqliteJobBackend:
+    def __init__(self, path=JOB_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def save(self, record):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, record) VALUES (?, ?)",
+                (record["job_id"], json.dumps(record, default=str))
+            )
+
+    def load(self, job_id):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, message):
+        # No queue trigger locally: run the job on a daemon thread in this process
+        threading.Thread(target=self._deliver, args=(message,), daemon=True).start()
+
+    def _deliver(self, message):
+        # Redeliver transient failures the way the queue trigger would
+        for dequeue_count in range(1, JOB_MAX_DEQUEUE_COUNT + 1):
+            try:
+                process_job_message(message, dequeue_count)
+                return
+            except Exception:
+                time.sleep(dequeue_count)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_job_backend():
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if JOB_QUEUE_BACKEND == "sqlite":
+                    _backend = SqliteJobBackend()
+                elif JOB_QUEUE_BACKEND == "storage":
+                    _backend = StorageJobBackend()
+                else:
+                    raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {JOB_QUEUE_BACKEND}")
+    return _backend
+
+
+def submit_job(kind, payload):
+    if kind not in _handlers:
+        raise ValueError(f"No job handler registered for '{kind}'")
+
+    backend = get_job_backend()
+    job_id = uuid.uuid4().hex
+    backend.save({
+        "job_id": job_id,
+        "kind": kind,
+        "status": "queued",
+        "created_at": _now(),
+        "updated_at": _now(),
+        "result": None,
+        "error": None
+    })
+    backend.enqueue(json.dumps({"job_id": job_id, "kind": kind, "payload": payload}))
+
+    logging.info(f"Queued {kind} job {job_id}")
+    return job_id
+
+
+def wants_background_job(req: func.HttpRequest) -> bool:
+    return req.params.get("async", "").lower() == "true"
+
+
+def job_accepted_response(job_id) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/jobStatus?job_id={job_id}"
+        }),
+        mimetype="application/json",
+        status_code=202
+    )
+
+
+def get_job(job_id):
+    return get_job_backend().load(job_id)
+
+
+def _is_retryable(error):
+    import openai
+    import pyodbc
+    from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+    # Blob/search throttling and 5xx, LLM 429/5xx, SQL timeouts and dropped connections
+    if isinstance(error, (
+        ServiceRequestError, ServiceResponseError,
+        openai.APITimeoutError, openai.APIConnectionError,
+        pyodbc.OperationalError,
+        TimeoutError, ConnectionError
+    )):
+        return True
+    if isinstance(error, (HttpResponseError, openai.APIStatusError)):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def process_job_message(message, dequeue_count=1):
+    backend = get_job_backend()
+    job = json.loads(message)
+    record = backend.load(job["job_id"]) or {"job_id": job["job_id"], "kind": job["kind"], "created_at": _now()}
+
+    # Queue delivery is at-least-once; don't redo finished work
+    if record.get("status") in ("succeeded", "failed"):
+        logging.info(f"Job {job['job_id']} already {record['status']}; skipping redelivery")
+        return
+
+    record.update(status="running", updated_at=_now())
+    backend.save(record)
+
+    try:
+        result = _handlers[job["kind"]](job["payload"])
+        record.update(status="succeeded", result=result, error=None, updated_at=_now())
+    except Exception as e:
+        if dequeue_count < JOB_MAX_DEQUEUE_COUNT and _is_retryable(e):
+            # Re-raise so the queue redelivers the message after its visibility timeout
+            logging.warning(
+                f"Job {job['job_id']} hit a transient error on delivery {dequeue_count}/{JOB_MAX_DEQUEUE_COUNT}; "
+                f"leaving it to the queue to retry: {e}"
+            )
+            record.update(status="retrying", error=str(e), updated_at=_now())
+            backend.save(record)
+            raise
+
+        logging.exception(f"Job {job['job_id']} failed")
+        record.update(status="failed", error=str(e), updated_at=_now())
+
+    backend.save(record)
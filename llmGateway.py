@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeout, wait
+
+from clientPool import get_openai_client, get_async_openai_client
+from promptBuilder import count_tokens
+from telemetry import bind, record_retry
+
+# Every chat and embeddings call goes through here. Each deployment gets
+# requests-per-minute and tokens-per-minute buckets sized to its quota, throttled
+# or failed calls are retried with backoff (honouring retry-after) on whichever
+# deployment frees up first, and slow calls can be hedged onto a second deployment.
+#
+# Limits are per worker process: set them to the deployment quota divided by the
+# number of workers that share it. 0 means no local limit.
+LLM_CHAT_RPM_LIMIT = int(os.getenv("LLM_CHAT_RPM_LIMIT", "0"))
+LLM_CHAT_TPM_LIMIT = int(os.getenv("LLM_CHAT_TPM_LIMIT", "0"))
+LLM_EMBEDDING_RPM_LIMIT = int(os.getenv("LLM_EMBEDDING_RPM_LIMIT", "0"))
+LLM_EMBEDDING_TPM_LIMIT = int(os.getenv("LLM_EMBEDDING_TPM_LIMIT", "0"))
+
+# Completion tokens count against TPM too; reserved up front when max_tokens isn't given
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "1000"))
+
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "6"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# Start a second copy of a call on another deployment when the first hasn't answered
+# within this many seconds (roughly the p95 latency). 0 disables hedging.
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "32"))
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        # Takes the amount now, possibly going negative, and returns how long the
+        # caller has to wait for it; callers queue up in reservation order.
+        if not self.capacity:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def wait_time(self, amount):
+        if not self.capacity:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def drain(self):
+        if self.capacity:
+            with self.lock:
+                self.tokens = min(self.tokens, 0.0)
+
+
+class Deployment:
+    def __init__(self, name, rpm, tpm):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+
+    def wait_time(self, tokens):
+        cooldown = max(0.0, self.cooldown_until - time.monotonic())
+        return max(cooldown, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def reserve(self, tokens):
+        cooldown = max(0.0, self.cooldown_until - time.monotonic())
+        return max(cooldown, self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def back_off(self, seconds, throttled):
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        if throttled:
+            # The service says the quota is spent; stop handing out local capacity too
+            self.requests.drain()
+            self.tokens.drain()
+
+
+def _is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _backoff(error, attempt):
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX_SECONDS) + random.uniform(0, LLM_BACKOFF_BASE_SECONDS)
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+    return _hedge_pool
+
+
+class LLMGateway:
+    def __init__(self, kind, deployment_names, rpm, tpm):
+        self.kind = kind
+        self.deployments = [Deployment(name, rpm, tpm) for name in deployment_names]
+
+    def _pick(self, tokens, exclude=()):
+        candidates = [d for d in self.deployments if d.name not in exclude] or self.deployments
+        return min(candidates, key=lambda d: d.wait_time(tokens))
+
+    def _hedge_target(self, tokens, primary):
+        if LLM_HEDGE_AFTER_SECONDS <= 0 or len(self.deployments) < 2:
+            return None
+        backup = self._pick(tokens, exclude={primary.name})
+        # Never hedge into a deployment that would have to wait for quota
+        if backup is primary or backup.wait_time(tokens) > 0:
+            return None
+        backup.reserve(tokens)
+        return backup
+
+    def _on_error(self, deployment, error, attempt):
+        if not _is_retryable(error) or attempt == LLM_MAX_ATTEMPTS - 1:
+            return False
+
+        delay = _backoff(error, attempt)
+        status_code = getattr(error, "status_code", None)
+        deployment.back_off(delay, throttled=status_code == 429)
+        record_retry(f"llm.{self.kind}")
+        logging.warning(
+            f"{self.kind} call on {deployment.name} failed ({status_code or type(error).__name__}); "
+            f"retrying (attempt {attempt + 2}/{LLM_MAX_ATTEMPTS}) after backing it off {delay:.1f}s"
+        )
+        return True
+
+    def call(self, create, tokens, hedge=True):
+        # create(deployment_name) performs the request
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            deployment = self._pick(tokens)
+            delay = deployment.reserve(tokens)
+            if delay:
+                time.sleep(delay)
+
+            try:
+                if hedge:
+                    return self._call_hedged(create, deployment, tokens)
+                return create(deployment.name)
+            except Exception as e:
+                if not self._on_error(deployment, e, attempt):
+                    raise
+
+    def _call_hedged(self, create, primary, tokens):
+        if LLM_HEDGE_AFTER_SECONDS <= 0 or len(self.deployments) < 2:
+            return create(primary.name)
+
+        pool = _get_hedge_pool()
+        first = pool.submit(bind(create), primary.name)
+        try:
+            return first.result(timeout=LLM_HEDGE_AFTER_SECONDS)
+        except FuturesTimeout:
+            pass
+
+        backup = self._hedge_target(tokens, primary)
+        if backup is None:
+            return first.result()
+
+        record_retry(f"llm.{self.kind}.hedge")
+        second = pool.submit(bind(create), backup.name)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+
+        # The slower call keeps running in the pool; its result is discarded
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+        other = second if first in done else first
+        return other.result()
+
+    async def call_async(self, create, tokens, hedge=True):
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            deployment = self._pick(tokens)
+            delay = deployment.reserve(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+
+            try:
+                if hedge:
+                    return await self._call_hedged_async(create, deployment, tokens)
+                return await create(deployment.name)
+            except Exception as e:
+                if not self._on_error(deployment, e, attempt):
+                    raise
+
+    async def _call_hedged_async(self, create, primary, tokens):
+        if LLM_HEDGE_AFTER_SECONDS <= 0 or len(self.deployments) < 2:
+            return await create(primary.name)
+
+        first = asyncio.ensure_future(create(primary.name))
+        done, _ = await asyncio.wait({first}, timeout=LLM_HEDGE_AFTER_SECONDS)
+        if done:
+            return first.result()
+
+        backup = self._hedge_target(tokens, primary)
+        if backup is None:
+            return await first
+
+        record_retry(f"llm.{self.kind}.hedge")
+        second = asyncio.ensure_future(create(backup.name))
+        done, pending = await asyncio.wait({first, second}, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+        if pending:
+            return await pending.pop()
+        return first.result()
+
+
+def _deployment_names(list_variable, single_variable):
+    names = [name.strip() for name in os.getenv(list_variable, "").split(",") if name.strip()]
+    return names or [os.environ[single_variable]]
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def _get_gateway(kind):
+    gateway = _gateways.get(kind)
+    if gateway is None:
+        with _gateways_lock:
+            gateway = _gateways.get(kind)
+            if gateway is None:
+                if kind == "chat":
+                    gateway = LLMGateway(
+                        kind,
+                        _deployment_names("AZURE_OPENAI_DEPLOYMENTS", "AZURE_OPENAI_DEPLOYMENT"),
+                        LLM_CHAT_RPM_LIMIT,
+                        LLM_CHAT_TPM_LIMIT
+                    )
+                else:
+                    gateway = LLMGateway(
+                        kind,
+                        _deployment_names("AZURE_OPENAI_EMBEDDING_DEPLOYMENTS", "AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+                        LLM_EMBEDDING_RPM_LIMIT,
+                        LLM_EMBEDDING_TPM_LIMIT
+                    )
+                _gateways[kind] = gateway
+    return gateway
+
+
+def _chat_tokens(messages, kwargs):
+    prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+    return prompt_tokens + (kwargs.get("max_tokens") or LLM_COMPLETION_TOKEN_ESTIMATE)
+
+
+def _embedding_tokens(texts):
+    return sum(count_tokens(text) for text in texts)
+
+
+# Failover and hedging can answer from any deployment in AZURE_OPENAI_EMBEDDING_DEPLOYMENTS,
+# while the embedding cache and the search index hold one set of vectors, so every
+# deployment has to serve the same model at the same dimension
+_embedding_signatures = {}
+_embedding_signatures_lock = threading.Lock()
+
+
+def _check_embedding_deployment(deployment, response, dimensions=None):
+    if not response.data:
+        return response
+
+    signature = (getattr(response, "model", None), len(response.data[0].embedding))
+    with _embedding_signatures_lock:
+        first_deployment, expected = _embedding_signatures.setdefault(dimensions, (deployment, signature))
+
+    if signature != expected:
+        raise ValueError(
+            f"Embedding deployment {deployment} serves {signature[0]} ({signature[1]} dimensions) but "
+            f"{first_deployment} serves {expected[0]} ({expected[1]} dimensions); all deployments in "
+            f"AZURE_OPENAI_EMBEDDING_DEPLOYMENTS must use the same model and dimension"
+        )
+    return response
+
+
+def chat_completion(messages, **kwargs):
+    client = get_openai_client()
+    return _get_gateway("chat").call(
+        lambda deployment: client.chat.completions.create(model=deployment, messages=messages, **kwargs),
+        _chat_tokens(messages, kwargs)
+    )
+
+
+def create_embeddings(texts, **kwargs):
+    client = get_openai_client()
+    return _get_gateway("embeddings").call(
+        lambda deployment: _check_embedding_deployment(
+            deployment,
+            client.embeddings.create(model=deployment, input=texts, **kwargs),
+            kwargs.get("dimensions")
+        ),
+        _embedding_tokens(texts)
+    )
+
+
+async def chat_completion_async(messages, **kwargs):
+    client = get_async_openai_client()
+    return await _get_gateway("chat").call_async(
+        lambda deployment: client.chat.completions.create(model=deployment, messages=messages, **kwargs),
+        _chat_tokens(messages, kwargs)
+    )
+
+
+async def create_embeddings_async(texts, **kwargs):
+    client = get_async_openai_client()
+
+    async def create(deployment):
+        response = await client.embeddings.create(model=deployment, input=texts, **kwargs)
+        return _check_embedding_deployment(deployment, response, kwargs.get("dimensions"))
+
+    return await _get_gateway("embeddings").call_async(create, _embedding_tokens(texts))
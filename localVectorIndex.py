@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from clientPool import get_search_client
+
+# Local copy of the assignment index (embeddings + display fields) for
+# in-process cosine retrieval. The catalog is a few thousand chunks, so an
+# exact, vectorized top-k over a memory-mapped matrix is well under a millisecond.
+LOCAL_VECTOR_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", os.path.join(tempfile.gettempdir(), "gtfy_vector_index"))
+LOCAL_VECTOR_INDEX_REFRESH_SECONDS = int(os.getenv("LOCAL_VECTOR_INDEX_REFRESH_SECONDS", "3600"))
+# After a failed sync (e.g. the search service is throttling) the old copy is served this long before retrying
+LOCAL_VECTOR_INDEX_RETRY_SECONDS = int(os.getenv("LOCAL_VECTOR_INDEX_RETRY_SECONDS", "300"))
+LOCAL_VECTOR_INDEX_FIELDS = ["id", "title", "company", "location", "type", "gtd_id", "req_skills", "key_responsibilities"]
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+class LocalVectorIndex:
+    def __init__(self, directory=LOCAL_VECTOR_INDEX_DIR, refresh_seconds=LOCAL_VECTOR_INDEX_REFRESH_SECONDS):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self._vectors = None
+        self._documents = []
+        self._synced_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        # Held for a whole sync (a full scan of the remote index), never by the fallback path
+        self._sync_lock = threading.Lock()
+        self._refresher = None
+        self._wake = threading.Event()
+
+    @property
+    def is_stale(self):
+        return self._vectors is None or time.time() - self._synced_at > self.refresh_seconds
+
+    def sync(self, search_client=None):
+        import numpy as np
+
+        search_client = search_client or get_search_client()
+        started = time.perf_counter()
+
+        vectors = []
+        documents = []
+        for doc in search_client.search(search_text="*", select=LOCAL_VECTOR_INDEX_FIELDS + ["embedding"]):
+            embedding = doc.get("embedding")
+            if not embedding:
+                continue
+            vectors.append(embedding)
+            documents.append({field: doc.get(field) for field in LOCAL_VECTOR_INDEX_FIELDS})
+
+        if not vectors:
+            raise ValueError("Search index returned no documents with embeddings.")
+
+        # Rows are L2-normalized once, so cosine similarity is a single mat-vec product
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        os.makedirs(self.directory, exist_ok=True)
+        synced_at = time.time()
+
+        # Write to temp files and swap, so a concurrent load never sees a partial index
+        vectors_tmp = os.path.join(self.directory, f".{VECTORS_FILE}.tmp")
+        with open(vectors_tmp, "wb") as f:
+            np.save(f, matrix)
+        os.replace(vectors_tmp, os.path.join(self.directory, VECTORS_FILE))
+
+        documents_tmp = os.path.join(self.directory, f".{DOCUMENTS_FILE}.tmp")
+        with open(documents_tmp, "w", encoding="utf-8") as f:
+            json.dump({"synced_at": synced_at, "documents": documents}, f)
+        os.replace(documents_tmp, os.path.join(self.directory, DOCUMENTS_FILE))
+
+        logging.info(
+            f"Synced local vector index: {len(documents)} chunks x {matrix.shape[1]} dims "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        self.load()
+
+    def load(self):
+        import numpy as np
+
+        vectors_path = os.path.join(self.directory, VECTORS_FILE)
+        documents_path = os.path.join(self.directory, DOCUMENTS_FILE)
+        if not (os.path.exists(vectors_path) and os.path.exists(documents_path)):
+            return False
+
+        with open(documents_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if vectors.shape[0] != len(manifest["documents"]):
+            logging.warning("Local vector index files are out of step; ignoring them.")
+            return False
+
+        self._vectors = vectors
+        self._documents = manifest["documents"]
+        self._synced_at = manifest["synced_at"]
+        return True
+
+    def ensure_fresh(self, sync=True):
+        # sync=False only loads what is on disk; the throttling fallback must not
+        # scan the same service that is throttling it
+        if not self.is_stale:
+            return
+
+        if self._vectors is None:
+            with self._lock:
+                if self._vectors is None:
+                    self.load()
+
+        if sync and self.is_stale and time.monotonic() >= self._retry_at:
+            with self._sync_lock:
+                try:
+                    if self.is_stale:
+                        self.sync()
+                except Exception as e:
+                    if self._vectors is None:
+                        raise
+                    self._retry_at = time.monotonic() + LOCAL_VECTOR_INDEX_RETRY_SECONDS
+                    logging.warning(
+                        f"Local vector index sync failed ({e}); serving the copy from "
+                        f"{(time.time() - self._synced_at) / 60:.0f} minutes ago."
+                    )
+
+        if self._vectors is None:
+            raise RuntimeError("The local vector index has not been synced yet.")
+
+    def start_refresher(self):
+        # Keeps the copy warm off the request path, so a fallback finds it ready
+        if self._refresher is not None:
+            return
+
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="local-vector-index", daemon=True)
+                self._refresher.start()
+
+    def refresh_soon(self):
+        # The remote index changed (ingestion run); resync without waiting for the interval
+        if self._refresher is not None:
+            self._wake.set()
+
+    def _refresh_loop(self):
+        while True:
+            forced = self._wake.is_set()
+            self._wake.clear()
+
+            with self._lock:
+                if self._vectors is None:
+                    self.load()
+                due = forced or self.is_stale
+
+            delay = max(self.refresh_seconds - (time.time() - self._synced_at), 1)
+            if due:
+                try:
+                    with self._sync_lock:
+                        self.sync()
+                    delay = self.refresh_seconds
+                except Exception as e:
+                    logging.warning(f"Background sync of the local vector index failed: {e}")
+                    delay = LOCAL_VECTOR_INDEX_RETRY_SECONDS
+
+            self._wake.wait(delay)
+
+    def search(self, search_text=None, vector_queries=None, top=50, sync=True, **kwargs):
+        # Same call shape as SearchClient.search so it can stand in for it.
+        # Only the vector part is served locally; text, semantic and highlight options are ignored.
+        import numpy as np
+
+        if not vector_queries:
+            raise ValueError("The local vector index only serves vector queries.")
+
+        vector_query = vector_queries[0]
+        k = min(vector_query.k_nearest_neighbors or top, top)
+
+        self.ensure_fresh(sync)
+        vectors, documents = self._vectors, self._documents
+
+        query = np.asarray(vector_query.vector, dtype=np.float32)
+        if query.shape[0] != vectors.shape[1]:
+            raise ValueError(f"Query vector has {query.shape[0]} dims, local index has {vectors.shape[1]}.")
+        query /= np.linalg.norm(query) or 1.0
+
+        scores = vectors @ query
+        k = min(k, scores.shape[0])
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+        results = []
+        for idx in top_idx:
+            doc = dict(documents[idx])
+            doc["@search.score"] = float(scores[idx])
+            results.append(doc)
+        return results
+
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_vector_index():
+    global _local_index
+
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                _local_index = LocalVectorIndex()
+    return _local_index
@@ -0,0 +1,147 @@
+import logging
+import os
+import re
+import threading
+
+# Token-aware prompt inputs: resume text is cleaned of boilerplate and repeated
+# lines, measured with the deployment's tokenizer, and split into chunks when it
+# is too long for a single parse call.
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "o200k_base")  # gpt-4o family
+RESUME_CHUNK_MAX_TOKENS = int(os.getenv("RESUME_CHUNK_MAX_TOKENS", "3000"))
+ENHANCE_RESUME_MAX_TOKENS = int(os.getenv("ENHANCE_RESUME_MAX_TOKENS", "8000"))
+ENHANCE_JOB_MAX_TOKENS = int(os.getenv("ENHANCE_JOB_MAX_TOKENS", "2000"))
+
+# Repeats shorter than this (dates, single skills) are kept, they are cheap and often meaningful
+MIN_DEDUPE_LINE_CHARS = 20
+
+BOILERPLATE_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r"^page\s+\d+(\s+of\s+\d+)?$",
+        r"^\d+\s*/\s*\d+$",
+        r"^-?\s*\d{1,3}\s*-?$",
+        r"^(curriculum vitae|resume|résumé|cv)$",
+        r"^references( are)? available (up)?on request\.?$",
+        r"^(private (and|&) )?confidential$",
+    )
+]
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(PROMPT_TOKEN_ENCODING)
+                except Exception as e:
+                    # No tokenizer files (e.g. offline): fall back to the ~4 chars/token estimate
+                    logging.warning(f"tiktoken unavailable ({e}); estimating token counts.")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+
+    logging.info(f"Truncating prompt text from {len(tokens)} to {max_tokens} tokens")
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_to_token_windows(text, max_tokens, overlap_tokens=0) -> list:
+    # Fixed-size windows for text without useful line breaks (e.g. job descriptions);
+    # the overlap keeps a sentence cut at a boundary whole in one of the two windows
+    step = max(max_tokens - overlap_tokens, 1)
+    encoding = _get_encoding()
+
+    if encoding is None:
+        max_chars, step_chars = max_tokens * 4, step * 4
+        return [text[i:i + max_chars] for i in range(0, max(len(text) - overlap_tokens * 4, 1), step_chars)]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    return [
+        encoding.decode(tokens[i:i + max_tokens])
+        for i in range(0, max(len(tokens) - overlap_tokens, 1), step)
+    ]
+
+
+def clean_resume_text(text) -> str:
+    lines = []
+    seen = set()
+
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            continue
+        if any(pattern.match(line) for pattern in BOILERPLATE_PATTERNS):
+            continue
+
+        # Layout-model output repeats table cells after the page lines
+        key = line.casefold()
+        if len(line) >= MIN_DEDUPE_LINE_CHARS:
+            if key in seen:
+                continue
+            seen.add(key)
+
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def chunk_text(text, max_tokens=RESUME_CHUNK_MAX_TOKENS) -> list:
+    # Chunks break on line boundaries so sections and bullets stay intact
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for line in text.splitlines():
+        line_tokens = count_tokens(line) + 1
+        if line_tokens > max_tokens:
+            line = truncate_to_tokens(line, max_tokens - 1)
+            line_tokens = max_tokens
+
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+
+        current.append(line)
+        current_tokens += line_tokens
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return chunks or [""]
+
+
+def prepare_resume_chunks(resume_text, max_tokens=RESUME_CHUNK_MAX_TOKENS) -> list:
+    cleaned = clean_resume_text(resume_text)
+    chunks = chunk_text(cleaned, max_tokens)
+    logging.info(
+        f"Resume prompt: {count_tokens(resume_text)} tokens raw, "
+        f"{count_tokens(cleaned)} cleaned, {len(chunks)} chunk(s)"
+    )
+    return chunks
+
+
+def prepare_resume_text(resume_text, max_tokens) -> str:
+    return truncate_to_tokens(clean_resume_text(resume_text), max_tokens)
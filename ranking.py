@@ -0,0 +1,114 @@
+from telemetry import traced
+
+# Turns search hits (one per description chunk) into one ranked entry per
+# assignment. Scores and group ids are handled as columns so the cost stays
+# flat at top=1000; only highlight merging touches individual documents.
+AGGREGATIONS = ("max", "mean_top_n", "rrf")
+HIGHLIGHT_FIELDS = ("req_skills", "key_responsibilities", "job_desc")
+RRF_SCORE_FIELDS = ("@search.score", "@search.reranker_score")
+RRF_K = 60
+
+
+def job_id_of(doc):
+    return doc.get("gtd_id") or doc["id"].split("_")[0]
+
+
+def fuse_result_lists(result_lists, k=RRF_K):
+    # Reciprocal rank fusion of separately retrieved lists (e.g. BM25 and vector),
+    # whose raw scores live on different scales. Returns one doc per id.
+    fused = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            entry = fused.get(doc["id"])
+            if entry is None:
+                entry = fused[doc["id"]] = dict(doc)
+                entry["@search.score"] = 0.0
+            elif doc.get("@search.highlights") and not entry.get("@search.highlights"):
+                entry["@search.highlights"] = doc["@search.highlights"]
+            entry["@search.score"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda d: d["@search.score"], reverse=True)
+
+
+def _rrf_chunk_scores(results, k):
+    import numpy as np
+
+    fused = np.zeros(len(results), dtype=np.float64)
+    for field in RRF_SCORE_FIELDS:
+        column = np.array([doc.get(field) if doc.get(field) is not None else np.nan for doc in results], dtype=np.float64)
+        present = ~np.isnan(column)
+        if not present.any():
+            continue
+
+        # Rank 1 is the best score; docs without this score get no contribution
+        order = np.argsort(-np.where(present, column, -np.inf), kind="stable")
+        ranks = np.empty(len(results), dtype=np.float64)
+        ranks[order] = np.arange(1, len(results) + 1)
+        fused += np.where(present, 1.0 / (k + ranks), 0.0)
+    return fused
+
+
+@traced("rank")
+def rank_jobs(results, aggregation="max", top_n=3, rrf_k=RRF_K):
+    import numpy as np
+
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{aggregation}'. Expected one of: {', '.join(AGGREGATIONS)}")
+    if not results:
+        return []
+
+    results = list(results)
+    chunk_scores = np.array([doc["@search.score"] for doc in results], dtype=np.float64)
+    job_ids, group_idx = np.unique([job_id_of(doc) for doc in results], return_inverse=True)
+
+    # Sort by group, then best score first, so each group is one contiguous run
+    order = np.lexsort((-chunk_scores, group_idx))
+    sorted_groups = group_idx[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    top_doc_idx = order[starts]
+
+    if aggregation == "max":
+        job_scores = chunk_scores[top_doc_idx]
+    elif aggregation == "mean_top_n":
+        rank_in_group = np.arange(len(order)) - np.repeat(starts, counts)
+        keep = rank_in_group < top_n
+        totals = np.bincount(sorted_groups[keep], weights=chunk_scores[order][keep], minlength=len(job_ids))
+        job_scores = totals / np.minimum(counts, top_n)
+    else:
+        rrf_scores = _rrf_chunk_scores(results, rrf_k)
+        job_scores = np.zeros(len(job_ids), dtype=np.float64)
+        np.maximum.at(job_scores, group_idx, rrf_scores)
+
+    # Local cosine scores can be negative; those jobs show as a 0% match
+    max_score = job_scores.max()
+    if max_score > 0:
+        match_percent = np.clip(job_scores / max_score * 100, 0, 100).astype(int)
+    else:
+        match_percent = np.zeros(len(job_ids), dtype=int)
+
+    highlights = [dict() for _ in job_ids]
+    for position in order:
+        doc_highlights = results[position].get("@search.highlights")
+        if doc_highlights:
+            merged = highlights[group_idx[position]]
+            for field in HIGHLIGHT_FIELDS:
+                merged.update(dict.fromkeys(doc_highlights.get(field, [])))
+
+    final_jobs = []
+    for group in np.argsort(-job_scores, kind="stable"):
+        top_doc = results[top_doc_idx[group]]
+        final_jobs.append({
+            "id": str(job_ids[group]),
+            "title": top_doc.get("title", ""),
+            "company": top_doc.get("company", ""),
+            "location": top_doc.get("location", ""),
+            "type": top_doc.get("type", ""),
+            "req_skills": top_doc.get("req_skills"),
+            "key_responsibilities": top_doc.get("key_responsibilities"),
+            "matchPercent": int(match_percent[group]),
+            "highlightedSkills": list(highlights[group]),
+            "matchedChunkCount": int(counts[group])
+        })
+
+    return final_jobs
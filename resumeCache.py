@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+
+from telemetry import record_cache
+
+# Local, per-instance cache of everything derived from a resume blob.
+# Defaults to the temp dir; point RESUME_CACHE_PATH at /home/... to survive restarts.
+RESUME_CACHE_PATH = os.getenv("RESUME_CACHE_PATH", os.path.join(tempfile.gettempdir(), "gtfy_resume_cache.sqlite3"))
+RESUME_CACHE_TTL_SECONDS = int(os.getenv("RESUME_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESUME_CACHE_MAX_BYTES = int(os.getenv("RESUME_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_initialized = False
+
+
+def resume_cache_key(blob_name, etag=None, content=None, *variants):
+    if not etag and content is None:
+        raise ValueError("Either an ETag or the blob content is required to key the resume cache.")
+
+    digest = hashlib.sha256()
+    digest.update(blob_name.encode("utf-8"))
+    if etag:
+        digest.update(b"etag:" + etag.strip('"').encode("utf-8"))
+    else:
+        digest.update(b"sha256:" + hashlib.sha256(content).hexdigest().encode("ascii"))
+
+    # Model deployments etc. - a change there must not serve stale results
+    for variant in variants:
+        digest.update(b"|" + str(variant or "").encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def _connect():
+    global _initialized
+
+    conn = sqlite3.connect(RESUME_CACHE_PATH, timeout=5)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS resume_cache ("
+            " cache_key TEXT PRIMARY KEY,"
+            " resume_text TEXT NOT NULL,"
+            " structured_resume TEXT NOT NULL,"
+            " search_keywords TEXT NOT NULL,"
+            " resume_vector BLOB NOT NULL,"
+            " size_bytes INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_resume_cache_last_access ON resume_cache (last_access)")
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def get_cached_resume(cache_key):
+    profile = _lookup(cache_key)
+    record_cache("resume", hits=int(profile is not None), misses=int(profile is None))
+    return profile
+
+
+def _lookup(cache_key):
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                row = conn.execute(
+                    "SELECT resume_text, structured_resume, search_keywords, resume_vector, created_at "
+                    "FROM resume_cache WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+
+                if not row:
+                    return None
+
+                now = time.time()
+                if now - row[4] > RESUME_CACHE_TTL_SECONDS:
+                    conn.execute("DELETE FROM resume_cache WHERE cache_key = ?", (cache_key,))
+                    conn.commit()
+                    return None
+
+                conn.execute("UPDATE resume_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+                conn.commit()
+            finally:
+                conn.close()
+
+        vector = array("f")
+        vector.frombytes(row[3])
+        return {
+            "resume_text": row[0],
+            "structured_resume": json.loads(row[1]),
+            "search_keywords": row[2],
+            "resume_vector": vector.tolist()
+        }
+
+    except sqlite3.Error as e:
+        # The cache is an optimization only - never fail a match because of it
+        logging.warning(f"Resume cache lookup failed: {str(e)}")
+        return None
+
+
+def store_cached_resume(cache_key, resume_text, structured_resume, search_keywords, resume_vector):
+    structured_json = json.dumps(structured_resume)
+    vector_bytes = array("f", resume_vector).tobytes()
+    size_bytes = len(resume_text.encode("utf-8")) + len(structured_json) + len(search_keywords) + len(vector_bytes)
+
+    if size_bytes > RESUME_CACHE_MAX_BYTES:
+        logging.info(f"Resume cache entry of {size_bytes} bytes exceeds the cache budget; not caching.")
+        return
+
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO resume_cache "
+                    "(cache_key, resume_text, structured_resume, search_keywords, resume_vector, size_bytes, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key, resume_text, structured_json, search_keywords, vector_bytes, size_bytes, now, now)
+                )
+                _evict(conn, now)
+                conn.commit()
+            finally:
+                conn.close()
+
+    except sqlite3.Error as e:
+        logging.warning(f"Resume cache write failed: {str(e)}")
+
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM resume_cache WHERE created_at < ?", (now - RESUME_CACHE_TTL_SECONDS,))
+
+    total_bytes = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM resume_cache").fetchone()[0]
+    if total_bytes <= RESUME_CACHE_MAX_BYTES:
+        return
+
+    # Least recently used entries go first
+    evicted = 0
+    for cache_key, size_bytes in conn.execute(
+        "SELECT cache_key, size_bytes FROM resume_cache ORDER BY last_access ASC"
+    ).fetchall():
+        if total_bytes <= RESUME_CACHE_MAX_BYTES:
+            break
+        conn.execute("DELETE FROM resume_cache WHERE cache_key = ?", (cache_key,))
+        total_bytes -= size_bytes
+        evicted += 1
+
+    logging.info(f"Resume cache evicted {evicted} entries to stay under {RESUME_CACHE_MAX_BYTES} bytes.")
@@ -0,0 +1,235 @@
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError, ResourceModifiedError, ResourceNotFoundError, ResourceNotModifiedError
+)
+
+from telemetry import traced
+
+# The upload path records the newest resume in a small pointer blob outside the
+# resume folder, so resolving it costs one (conditional) read instead of a listing.
+POINTER_FOLDER = "manifests"
+
+_pointer_cache = {}
+_pointer_cache_lock = threading.Lock()
+
+
+def _pointer_blob_name(folder_prefix):
+    return f"{POINTER_FOLDER}/{folder_prefix.strip('/')}_latest.json"
+
+
+# Concurrent uploads race on the pointer: a write only lands if it names a newer
+# blob than the current one (conditional on its ETag), so the pointer never goes back
+POINTER_WRITE_ATTEMPTS = 5
+
+
+def _pointer_payload(blob_name, last_modified):
+    return json.dumps({
+        "blob_name": blob_name,
+        "last_modified": last_modified.isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    })
+
+
+def _json_content_settings():
+    from azure.storage.blob import ContentSettings
+
+    return ContentSettings(content_type="application/json")
+
+
+def _remember(container_name, folder_prefix, etag, blob_name):
+    with _pointer_cache_lock:
+        _pointer_cache[(container_name, folder_prefix.strip('/'))] = (etag, blob_name)
+
+
+def _cached_pointer(container_name, folder_prefix):
+    with _pointer_cache_lock:
+        return _pointer_cache.get((container_name, folder_prefix.strip('/')))
+
+
+def _forget(container_name, folder_prefix):
+    with _pointer_cache_lock:
+        _pointer_cache.pop((container_name, folder_prefix.strip('/')), None)
+
+
+def _should_replace(current, blob_name, last_modified, replacing):
+    if current is None or current["blob_name"] in (blob_name, replacing):
+        return True
+    # Pointers written before last_modified was recorded are always replaced
+    if "last_modified" not in current:
+        return True
+    return datetime.fromisoformat(current["last_modified"]) < last_modified
+
+
+def _write_conditions(etag):
+    if etag is None:
+        return {"overwrite": False}
+    return {"overwrite": True, "etag": etag, "match_condition": MatchConditions.IfNotModified}
+
+
+def write_latest_resume_pointer(blob_service_client, container_name, folder_prefix, blob_name, last_modified, replacing=None):
+    # replacing: a blob the pointer may name that is known to be gone, overwritten regardless of age
+    pointer_client = blob_service_client.get_blob_client(container=container_name, blob=_pointer_blob_name(folder_prefix))
+
+    for _ in range(POINTER_WRITE_ATTEMPTS):
+        try:
+            downloader = pointer_client.download_blob()
+            current, etag = json.loads(downloader.readall()), downloader.properties.etag
+        except ResourceNotFoundError:
+            current, etag = None, None
+
+        if not _should_replace(current, blob_name, last_modified, replacing):
+            logging.info(f"Latest-resume pointer already names newer blob {current['blob_name']}; keeping it.")
+            _remember(container_name, folder_prefix, etag, current["blob_name"])
+            return current["blob_name"]
+
+        try:
+            result = pointer_client.upload_blob(
+                _pointer_payload(blob_name, last_modified),
+                content_settings=_json_content_settings(),
+                **_write_conditions(etag)
+            )
+        except (ResourceModifiedError, ResourceExistsError):
+            continue
+
+        _remember(container_name, folder_prefix, result["etag"], blob_name)
+        return blob_name
+
+    raise RuntimeError(f"Latest-resume pointer for {folder_prefix} kept changing; gave up after {POINTER_WRITE_ATTEMPTS} attempts")
+
+
+async def write_latest_resume_pointer_async(blob_service_client, container_name, folder_prefix, blob_name, last_modified, replacing=None):
+    pointer_client = blob_service_client.get_blob_client(container=container_name, blob=_pointer_blob_name(folder_prefix))
+
+    for _ in range(POINTER_WRITE_ATTEMPTS):
+        try:
+            downloader = await pointer_client.download_blob()
+            current, etag = json.loads(await downloader.readall()), downloader.properties.etag
+        except ResourceNotFoundError:
+            current, etag = None, None
+
+        if not _should_replace(current, blob_name, last_modified, replacing):
+            _remember(container_name, folder_prefix, etag, current["blob_name"])
+            return current["blob_name"]
+
+        try:
+            result = await pointer_client.upload_blob(
+                _pointer_payload(blob_name, last_modified),
+                content_settings=_json_content_settings(),
+                **_write_conditions(etag)
+            )
+        except (ResourceModifiedError, ResourceExistsError):
+            continue
+
+        _remember(container_name, folder_prefix, result["etag"], blob_name)
+        return blob_name
+
+    raise RuntimeError(f"Latest-resume pointer for {folder_prefix} kept changing; gave up after {POINTER_WRITE_ATTEMPTS} attempts")
+
+
+def _list_latest_resume(blob_service_client, container_name, folder_prefix):
+    # Fallback for folders written before the pointer existed, or whose pointer names a deleted blob
+    container_client = blob_service_client.get_container_client(container_name)
+    blobs = list(container_client.list_blobs(name_starts_with=f"{folder_prefix.strip('/')}/"))
+
+    if not blobs:
+        raise FileNotFoundError(f"No files found in folder: {folder_prefix}")
+
+    return max(blobs, key=lambda b: b.last_modified)
+
+
+async def _list_latest_resume_async(blob_service_client, container_name, folder_prefix):
+    container_client = blob_service_client.get_container_client(container_name)
+    blobs = [blob async for blob in container_client.list_blobs(name_starts_with=f"{folder_prefix.strip('/')}/")]
+
+    if not blobs:
+        raise FileNotFoundError(f"No files found in folder: {folder_prefix}")
+
+    return max(blobs, key=lambda b: b.last_modified)
+
+
+def repair_latest_resume_pointer(blob_service_client, container_name, folder_prefix, missing_blob=None):
+    _forget(container_name, folder_prefix)
+    latest = _list_latest_resume(blob_service_client, container_name, folder_prefix)
+    return write_latest_resume_pointer(
+        blob_service_client, container_name, folder_prefix, latest.name, latest.last_modified, replacing=missing_blob
+    )
+
+
+async def repair_latest_resume_pointer_async(blob_service_client, container_name, folder_prefix, missing_blob=None):
+    _forget(container_name, folder_prefix)
+    latest = await _list_latest_resume_async(blob_service_client, container_name, folder_prefix)
+    return await write_latest_resume_pointer_async(
+        blob_service_client, container_name, folder_prefix, latest.name, latest.last_modified, replacing=missing_blob
+    )
+
+
+@traced("blob.locate")
+def get_latest_resume_from_folder(blob_service_client, container_name, folder_prefix):
+    pointer_client = blob_service_client.get_blob_client(container=container_name, blob=_pointer_blob_name(folder_prefix))
+    cached = _cached_pointer(container_name, folder_prefix)
+
+    try:
+        if cached:
+            # 304 when the pointer is unchanged, no body transferred
+            downloader = pointer_client.download_blob(etag=cached[0], match_condition=MatchConditions.IfModified)
+        else:
+            downloader = pointer_client.download_blob()
+        blob_name = json.loads(downloader.readall())["blob_name"]
+        _remember(container_name, folder_prefix, downloader.properties.etag, blob_name)
+        return blob_name
+
+    except ResourceNotModifiedError:
+        return cached[1]
+
+    except ResourceNotFoundError:
+        logging.info(f"No latest-resume pointer for {folder_prefix}; listing the folder once.")
+        return repair_latest_resume_pointer(blob_service_client, container_name, folder_prefix)
+
+
+@traced("blob.locate")
+async def get_latest_resume_from_folder_async(blob_service_client, container_name, folder_prefix):
+    pointer_client = blob_service_client.get_blob_client(container=container_name, blob=_pointer_blob_name(folder_prefix))
+    cached = _cached_pointer(container_name, folder_prefix)
+
+    try:
+        if cached:
+            downloader = await pointer_client.download_blob(etag=cached[0], match_condition=MatchConditions.IfModified)
+        else:
+            downloader = await pointer_client.download_blob()
+        blob_name = json.loads(await downloader.readall())["blob_name"]
+        _remember(container_name, folder_prefix, downloader.properties.etag, blob_name)
+        return blob_name
+
+    except ResourceNotModifiedError:
+        return cached[1]
+
+    except ResourceNotFoundError:
+        logging.info(f"No latest-resume pointer for {folder_prefix}; listing the folder once.")
+        return await repair_latest_resume_pointer_async(blob_service_client, container_name, folder_prefix)
+
+
+def read_latest_resume(blob_service_client, container_name, folder_prefix, read):
+    # read(blob_name) touches the resume itself; a 404 there means the pointer is
+    # stale (e.g. the blob was cleaned up), so re-list once and repair it
+    blob_name = get_latest_resume_from_folder(blob_service_client, container_name, folder_prefix)
+    try:
+        return blob_name, read(blob_name)
+    except ResourceNotFoundError:
+        logging.warning(f"Latest-resume pointer names missing blob {blob_name}; listing {folder_prefix}.")
+        blob_name = repair_latest_resume_pointer(blob_service_client, container_name, folder_prefix, blob_name)
+        return blob_name, read(blob_name)
+
+
+async def read_latest_resume_async(blob_service_client, container_name, folder_prefix, read):
+    blob_name = await get_latest_resume_from_folder_async(blob_service_client, container_name, folder_prefix)
+    try:
+        return blob_name, await read(blob_name)
+    except ResourceNotFoundError:
+        logging.warning(f"Latest-resume pointer names missing blob {blob_name}; listing {folder_prefix}.")
+        blob_name = await repair_latest_resume_pointer_async(blob_service_client, container_name, folder_prefix, blob_name)
+        return blob_name, await read(blob_name)
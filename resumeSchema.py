@@ -0,0 +1,140 @@
+import hashlib
+import json
+from dataclasses import dataclass, field, asdict, fields
+
+# Structured-output contract for resume parsing. The model is constrained to
+# RESUME_RESPONSE_FORMAT, so the reply is always valid JSON in this shape and
+# search keywords come back in the same call as the parsed resume.
+MAX_SEARCH_KEYWORDS = 20
+
+
+def _string(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _strings(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item for item in (_string(v) for v in value) if item]
+
+
+@dataclass
+class WorkExperience:
+    company: str = ""
+    title: str = ""
+    start_date: str = ""
+    end_date: str = ""
+    responsibilities: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WorkExperience":
+        if not isinstance(data, dict):
+            raise ValueError(f"work_experience entries must be objects, got {type(data).__name__}")
+        return cls(**{f.name: _string(data.get(f.name)) for f in fields(cls)})
+
+
+@dataclass
+class StructuredResume:
+    full_name: str = ""
+    location: str = ""
+    summary: str = ""
+    skills: list = field(default_factory=list)
+    certifications: list = field(default_factory=list)
+    work_experience: list = field(default_factory=list)
+    education: str = ""
+    languages: list = field(default_factory=list)
+    publications: list = field(default_factory=list)
+    search_keywords: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StructuredResume":
+        if not isinstance(data, dict):
+            raise ValueError(f"Resume output must be a JSON object, got {type(data).__name__}")
+
+        return cls(
+            full_name=_string(data.get("full_name")),
+            location=_string(data.get("location")),
+            summary=_string(data.get("summary")),
+            skills=_strings(data.get("skills")),
+            certifications=_strings(data.get("certifications")),
+            work_experience=[WorkExperience.from_dict(item) for item in data.get("work_experience") or []],
+            education=_string(data.get("education")),
+            languages=_strings(data.get("languages")),
+            publications=_strings(data.get("publications")),
+            search_keywords=_strings(data.get("search_keywords"))[:MAX_SEARCH_KEYWORDS],
+        )
+
+    @classmethod
+    def from_json(cls, content: str) -> "StructuredResume":
+        return cls.from_dict(json.loads(content))
+
+    def to_dict(self) -> dict:
+        # The stored/returned resume keeps its original shape; keywords travel separately
+        data = asdict(self)
+        del data["search_keywords"]
+        return data
+
+    def keyword_text(self) -> str:
+        return ", ".join(self.search_keywords)
+
+
+def merge_resumes(parts: list) -> StructuredResume:
+    # Reduce step for chunked parsing: lists are unioned in order, scalars keep the first non-empty value
+    merged = StructuredResume()
+    for part in parts:
+        for f in fields(StructuredResume):
+            value = getattr(part, f.name)
+            current = getattr(merged, f.name)
+            if isinstance(value, list):
+                current.extend(item for item in value if item not in current)
+            elif value and not current:
+                setattr(merged, f.name, value)
+
+    merged.search_keywords = merged.search_keywords[:MAX_SEARCH_KEYWORDS]
+    return merged
+
+
+def _string_array():
+    return {"type": "array", "items": {"type": "string"}}
+
+
+RESUME_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "full_name": {"type": "string"},
+        "location": {"type": "string"},
+        "summary": {"type": "string"},
+        "skills": _string_array(),
+        "certifications": _string_array(),
+        "work_experience": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {name: {"type": "string"} for name in (
+                    "company", "title", "start_date", "end_date", "responsibilities"
+                )},
+                "required": ["company", "title", "start_date", "end_date", "responsibilities"],
+                "additionalProperties": False,
+            },
+        },
+        "education": {"type": "string"},
+        "languages": _string_array(),
+        "publications": _string_array(),
+        "search_keywords": _string_array(),
+    },
+    "required": [
+        "full_name", "location", "summary", "skills", "certifications", "work_experience",
+        "education", "languages", "publications", "search_keywords"
+    ],
+    "additionalProperties": False,
+}
+
+RESUME_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "structured_resume", "strict": True, "schema": RESUME_JSON_SCHEMA},
+}
+
+# Part of the resume cache key, so a schema change rebuilds cached profiles
+RESUME_SCHEMA_DIGEST = hashlib.sha256(json.dumps(RESUME_JSON_SCHEMA, sort_keys=True).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+from clientPool import get_blob_service_client_aad
+from telemetry import record_cache
+
+# One place to sign read links. Signed URLs are reused until shortly before they
+# expire; with user delegation enabled, the delegation key is fetched once an hour.
+SAS_EXPIRY_MINUTES = int(os.getenv("SAS_EXPIRY_MINUTES", "60"))
+SAS_REFRESH_MARGIN_MINUTES = int(os.getenv("SAS_REFRESH_MARGIN_MINUTES", "5"))
+SAS_CACHE_MAX_ENTRIES = int(os.getenv("SAS_CACHE_MAX_ENTRIES", "10000"))
+
+USE_USER_DELEGATION = os.getenv("AZURE_BLOB_USE_USER_DELEGATION", "false").lower() == "true"
+USER_DELEGATION_KEY_REFRESH = timedelta(hours=1)
+# Keys stay valid past their refresh so SAS issued just before a refresh keep working
+USER_DELEGATION_KEY_LIFETIME = timedelta(hours=3)
+
+_sas_cache = OrderedDict()
+_sas_cache_lock = threading.Lock()
+
+_delegation_key = None
+_delegation_key_fetched_at = None
+_delegation_key_lock = threading.Lock()
+
+
+def _get_user_delegation_key(now):
+    global _delegation_key, _delegation_key_fetched_at
+
+    with _delegation_key_lock:
+        if _delegation_key is None or now - _delegation_key_fetched_at >= USER_DELEGATION_KEY_REFRESH:
+            logging.info("Fetching blob user delegation key")
+            _delegation_key = get_blob_service_client_aad().get_user_delegation_key(
+                key_start_time=now - timedelta(minutes=5),
+                key_expiry_time=now + USER_DELEGATION_KEY_LIFETIME
+            )
+            _delegation_key_fetched_at = now
+        return _delegation_key, _delegation_key_fetched_at + USER_DELEGATION_KEY_LIFETIME
+
+
+def _sign(blob_service_client, container_name, blob_name, permission, expiry):
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+    signing_args = {}
+    if USE_USER_DELEGATION:
+        delegation_key, key_expiry = _get_user_delegation_key(datetime.now(timezone.utc))
+        signing_args["user_delegation_key"] = delegation_key
+        expiry = min(expiry, key_expiry)
+    else:
+        signing_args["account_key"] = getattr(blob_service_client.credential, "account_key", None) or os.environ["AZURE_BLOB_KEY"]
+
+    sas_token = generate_blob_sas(
+        account_name=blob_service_client.account_name,
+        container_name=container_name,
+        blob_name=blob_name,
+        permission=BlobSasPermissions.from_string(permission),
+        expiry=expiry,
+        **signing_args
+    )
+    return sas_token, expiry
+
+
+def get_blob_sas_url(blob_service_client, container_name, blob_name, expiry_minutes=SAS_EXPIRY_MINUTES, permission="r"):
+    cache_key = (blob_service_client.account_name, container_name, blob_name, permission, expiry_minutes)
+    now = time.time()
+
+    with _sas_cache_lock:
+        cached = _sas_cache.get(cache_key)
+        if cached and cached[1] - SAS_REFRESH_MARGIN_MINUTES * 60 > now:
+            _sas_cache.move_to_end(cache_key)
+            record_cache("sas", hits=1)
+            return cached[0]
+
+    record_cache("sas", misses=1)
+
+    blob_url = blob_service_client.get_blob_client(container=container_name, blob=blob_name).url
+    sas_token, expiry = _sign(
+        blob_service_client,
+        container_name,
+        blob_name,
+        permission,
+        datetime.now(timezone.utc) + timedelta(minutes=expiry_minutes)
+    )
+    url = f"{blob_url}?{sas_token}"
+
+    with _sas_cache_lock:
+        _sas_cache[cache_key] = (url, expiry.timestamp())
+        _sas_cache.move_to_end(cache_key)
+        while len(_sas_cache) > SAS_CACHE_MAX_ENTRIES:
+            _sas_cache.popitem(last=False)
+
+    return url
+
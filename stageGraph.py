@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+
+from telemetry import record_span
+
+
+class Stage:
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+async def run_stage_graph(stages, inputs=None):
+    # Every stage starts as soon as the stages it depends on have finished, so
+    # independent branches (e.g. BM25 and vector search) overlap on the event loop.
+    # Stage functions receive a dict with the results of their dependencies.
+    by_name = {stage.name: stage for stage in stages}
+    results = dict(inputs or {})
+    tasks = {}
+    visiting = set()
+
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in by_name and dependency not in results:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+    def schedule(name):
+        if name in tasks:
+            return tasks[name]
+
+        if name in visiting:
+            raise ValueError(f"Stage graph has a cycle through '{name}'")
+        visiting.add(name)
+
+        stage = by_name[name]
+        dependency_tasks = [schedule(dep) for dep in stage.depends_on if dep in by_name]
+
+        async def run():
+            if dependency_tasks:
+                await asyncio.gather(*dependency_tasks)
+            args = {dep: results[dep] for dep in stage.depends_on}
+
+            started = time.perf_counter()
+            value = await stage.func(args)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logging.info(f"Stage '{name}' finished in {elapsed_ms:.0f} ms")
+            record_span(f"stage.{name}", elapsed_ms)
+
+            results[name] = value
+            return value
+
+        tasks[name] = asyncio.ensure_future(run())
+        return tasks[name]
+
+    for stage in stages:
+        schedule(stage.name)
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    return results
@@ -0,0 +1,270 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-request instrumentation: stage spans, model token usage, retries, cache hit
+# rates and payload sizes are collected while a route runs, then written as one
+# structured log line and returned to the browser in a Server-Timing header.
+# Spans are mirrored to OpenTelemetry when it is installed and enabled.
+TELEMETRY_OTEL_ENABLED = os.getenv("TELEMETRY_OTEL_ENABLED", "false").lower() == "true"
+TELEMETRY_SERVER_TIMING = os.getenv("TELEMETRY_SERVER_TIMING", "true").lower() == "true"
+
+_current = contextvars.ContextVar("request_telemetry", default=None)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class RequestTelemetry:
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.tokens = {}
+        self.retries = {}
+        self.cache = {}
+        self.payload_bytes = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, duration_ms):
+        with self._lock:
+            total, count = self.spans.get(name, (0.0, 0))
+            self.spans[name] = (total + duration_ms, count + 1)
+
+    def add(self, bucket, name, amount):
+        with self._lock:
+            bucket[name] = bucket.get(name, 0) + amount
+
+    def to_dict(self, status_code=None):
+        with self._lock:
+            return {
+                "event": "request_telemetry",
+                "route": self.route,
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "spans": {name: {"ms": round(total, 2), "count": count} for name, (total, count) in self.spans.items()},
+                "tokens": dict(self.tokens),
+                "retries": dict(self.retries),
+                "cache": {
+                    name: {**counts, "hit_rate": round(counts.get("hits", 0) / max(sum(counts.values()), 1), 3)}
+                    for name, counts in self.cache.items()
+                },
+                "payload_bytes": dict(self.payload_bytes),
+            }
+
+    def server_timing(self):
+        with self._lock:
+            entries = [
+                f'{name.replace(".", "-")};dur={total:.1f};desc="{count}x"'
+                for name, (total, count) in sorted(self.spans.items(), key=lambda item: -item[1][0])
+            ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def _get_tracer():
+    global _tracer
+
+    if not TELEMETRY_OTEL_ENABLED:
+        return None
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                try:
+                    from opentelemetry import trace
+                except ImportError:
+                    logging.warning("TELEMETRY_OTEL_ENABLED is set but opentelemetry is not installed.")
+                    _tracer = False
+                else:
+                    _configure_otel_exporter(trace)
+                    _tracer = trace.get_tracer("gtfy")
+    return _tracer or None
+
+
+def _configure_otel_exporter(trace):
+    # Application Insights when a connection string is present, otherwise OTLP
+    if os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"):
+        try:
+            from azure.monitor.opentelemetry import configure_azure_monitor
+            configure_azure_monitor()
+            return
+        except ImportError:
+            logging.warning("azure-monitor-opentelemetry is not installed; trying OTLP.")
+
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logging.warning("opentelemetry-sdk / OTLP exporter not installed; spans are not exported.")
+            return
+
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+
+
+@contextmanager
+def span(name, record=True, **attributes):
+    tracer = _get_tracer()
+    otel_span = tracer.start_as_current_span(name, attributes=attributes or None) if tracer else None
+    started = time.perf_counter()
+
+    try:
+        if otel_span:
+            with otel_span:
+                yield
+        else:
+            yield
+    finally:
+        if record:
+            record_span(name, (time.perf_counter() - started) * 1000)
+
+
+def traced(name):
+    # Function form of span() for helpers that are one stage end to end
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name, duration_ms):
+    telemetry = _current.get()
+    if telemetry:
+        telemetry.add_span(name, duration_ms)
+
+
+def record_usage(usage, kind="chat"):
+    telemetry = _current.get()
+    if telemetry is None or usage is None:
+        return
+
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, field, None)
+        if value:
+            telemetry.add(telemetry.tokens, f"{kind}.{field}", value)
+
+
+def record_retry(target, count=1):
+    telemetry = _current.get()
+    if telemetry:
+        telemetry.add(telemetry.retries, target, count)
+
+
+def record_cache(cache_name, hits=0, misses=0):
+    telemetry = _current.get()
+    if telemetry is None:
+        return
+
+    with telemetry._lock:
+        counts = telemetry.cache.setdefault(cache_name, {"hits": 0, "misses": 0})
+        counts["hits"] += hits
+        counts["misses"] += misses
+
+
+def record_payload(name, size_bytes):
+    telemetry = _current.get()
+    if telemetry and size_bytes:
+        telemetry.add(telemetry.payload_bytes, name, size_bytes)
+
+
+def bind(fn):
+    # ThreadPoolExecutor workers don't inherit contextvars; wrap callables submitted to one.
+    # Each call runs in its own copy, a Context can't be entered by two threads at once.
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# Azure SDK request hook (raw_request_hook). It runs inside the SDK's retry loop, once per
+# attempt, and the pipeline context is shared by the attempts of one operation, so every
+# attempt after the first is a retry the SDK made.
+_ATTEMPTS_KEY = "telemetry_attempts"
+
+
+def sdk_retry_hook(target):
+    def hook(request):
+        attempts = request.context.get(_ATTEMPTS_KEY, 0) + 1
+        request.context[_ATTEMPTS_KEY] = attempts
+        if attempts > 1:
+            record_retry(target)
+    return hook
+
+
+def _finish(telemetry, req, response, token):
+    status_code = getattr(response, "status_code", None)
+    try:
+        body = response.get_body() if response is not None else None
+        record_payload("response", len(body) if body else 0)
+        if TELEMETRY_SERVER_TIMING and response is not None:
+            response.headers["Server-Timing"] = telemetry.server_timing()
+        logging.info(json.dumps(telemetry.to_dict(status_code), default=str))
+    finally:
+        _current.reset(token)
+
+
+def _start(route, req):
+    telemetry = RequestTelemetry(route)
+    token = _current.set(telemetry)
+    if req is not None:
+        record_payload("request", len(req.get_body() or b""))
+    return telemetry, token
+
+
+def instrument_route(route):
+    # Goes directly above the def, below the route and binding decorators; functools.wraps
+    # keeps the signature the Functions worker reads its bindings from.
+    def decorator(handler):
+        def find_request(args, kwargs):
+            if "req" in kwargs:
+                return kwargs["req"]
+            return args[0] if args else None
+
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                req = find_request(args, kwargs)
+                telemetry, token = _start(route, req)
+                response = None
+                try:
+                    with span(f"route.{route}", record=False):
+                        response = await handler(*args, **kwargs)
+                    return response
+                finally:
+                    _finish(telemetry, req, response, token)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            req = find_request(args, kwargs)
+            telemetry, token = _start(route, req)
+            response = None
+            try:
+                with span(f"route.{route}", record=False):
+                    response = handler(*args, **kwargs)
+                return response
+            finally:
+                _finish(telemetry, req, response, token)
+        return wrapper
+    return decorator
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The function modules live at the repository root, as the Functions host loads them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+import json
+
+import httpx
+import openai
+import pytest
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+import jobQueue
+from jobQueue import SqliteJobBackend, process_job_message
+
+
+def throttled():
+    response = httpx.Response(429, request=httpx.Request("POST", "https://example.openai.azure.com/"))
+    return openai.RateLimitError("throttled", response=response, body=None)
+
+
+def blob_unavailable():
+    error = HttpResponseError("server busy")
+    error.status_code = 503
+    return error
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = SqliteJobBackend(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobQueue, "_backend", backend)
+    monkeypatch.setattr(jobQueue.time, "sleep", lambda seconds: None)
+    return backend
+
+
+def run_job(backend, handler, dequeue_count=1):
+    jobQueue.register_job_handler("test", handler)
+    backend.save({"job_id": "job1", "kind": "test", "status": "queued"})
+    process_job_message(json.dumps({"job_id": "job1", "kind": "test", "payload": {}}), dequeue_count)
+    return backend.load("job1")
+
+
+@pytest.mark.parametrize("error", [throttled(), blob_unavailable(), TimeoutError("sql timeout")])
+def test_transient_errors_go_back_to_the_queue(backend, error):
+    def handler(payload):
+        raise error
+
+    with pytest.raises(type(error)):
+        run_job(backend, handler, dequeue_count=1)
+    assert backend.load("job1")["status"] == "retrying"
+
+
+def test_the_last_delivery_marks_the_job_failed(backend):
+    def handler(payload):
+        raise throttled()
+
+    record = run_job(backend, handler, dequeue_count=jobQueue.JOB_MAX_DEQUEUE_COUNT)
+
+    assert record["status"] == "failed"
+    assert "throttled" in record["error"]
+
+
+@pytest.mark.parametrize("error", [ValueError("bad input"), ResourceNotFoundError("no resume")])
+def test_permanent_errors_fail_at_once(backend, error):
+    def handler(payload):
+        raise error
+
+    assert run_job(backend, handler)["status"] == "failed"
+
+
+def test_sqlite_backend_redelivers_transient_failures(backend):
+    attempts = []
+
+    def handler(payload):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise blob_unavailable()
+        return {"ok": True}
+
+    jobQueue.register_job_handler("test", handler)
+    backend.save({"job_id": "job1", "kind": "test", "status": "queued"})
+    backend._deliver(json.dumps({"job_id": "job1", "kind": "test", "payload": {}}))
+
+    record = backend.load("job1")
+    assert len(attempts) == 3
+    assert record["status"] == "succeeded"
+    assert record["result"] == {"ok": True}
+    assert record["error"] is None
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import llmGateway
+from llmGateway import LLMGateway
+
+
+def status_error(status_code, headers=None):
+    response = httpx.Response(
+        status_code, headers=headers or {}, request=httpx.Request("POST", "https://example.openai.azure.com/")
+    )
+    if status_code == 429:
+        return openai.RateLimitError("throttled", response=response, body=None)
+    return openai.InternalServerError("server error", response=response, body=None)
+
+
+class FakeCreate:
+    # create(deployment_name) that fails with the queued errors first, then answers
+    def __init__(self, errors=(), delays=None):
+        self.errors = list(errors)
+        self.delays = delays or {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, deployment):
+        with self.lock:
+            self.calls.append(deployment)
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        gate = self.delays.get(deployment)
+        if gate is not None:
+            gate.wait(5)
+        return f"answer from {deployment}"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(llmGateway.time, "sleep", slept.append)
+    # No jitter, so backoff delays are exact
+    monkeypatch.setattr(llmGateway, "LLM_BACKOFF_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(llmGateway, "LLM_HEDGE_AFTER_SECONDS", 0.0)
+    return slept
+
+
+def test_retry_after_ms_is_honoured(sleeps):
+    gateway = LLMGateway("chat", ["a"], 0, 0)
+    create = FakeCreate([status_error(429, {"retry-after-ms": "1500"})])
+
+    assert gateway.call(create, 10) == "answer from a"
+
+    assert create.calls == ["a", "a"]
+    assert sleeps == [pytest.approx(1.5, abs=0.05)]
+
+
+def test_retry_after_is_capped(sleeps, monkeypatch):
+    monkeypatch.setattr(llmGateway, "LLM_BACKOFF_MAX_SECONDS", 2.0)
+    gateway = LLMGateway("chat", ["a"], 0, 0)
+    create = FakeCreate([status_error(503, {"retry-after": "120"})])
+
+    assert gateway.call(create, 10) == "answer from a"
+    assert sleeps == [pytest.approx(2.0, abs=0.05)]
+
+
+def test_non_retryable_errors_and_the_last_attempt_raise(sleeps, monkeypatch):
+    gateway = LLMGateway("chat", ["a"], 0, 0)
+    with pytest.raises(ValueError):
+        gateway.call(FakeCreate([ValueError("bad request")]), 10)
+
+    monkeypatch.setattr(llmGateway, "LLM_MAX_ATTEMPTS", 2)
+    create = FakeCreate([status_error(500), status_error(500)])
+    with pytest.raises(openai.InternalServerError):
+        gateway.call(create, 10)
+    assert create.calls == ["a", "a"]
+
+
+def test_429_drains_the_deployment_and_fails_over(sleeps):
+    gateway = LLMGateway("chat", ["a", "b"], 60, 0)
+    create = FakeCreate([status_error(429)])
+
+    assert gateway.call(create, 10) == "answer from b"
+
+    # No retry-after and no jitter: the cooldown is zero, only the drained bucket moves the retry
+    assert create.calls == ["a", "b"]
+    assert sleeps == []
+    a, b = gateway.deployments
+    assert a.requests.tokens < 1
+    assert b.requests.tokens == pytest.approx(59, abs=0.1)
+
+
+def test_server_errors_do_not_drain(sleeps):
+    gateway = LLMGateway("chat", ["a", "b"], 60, 0)
+    create = FakeCreate([status_error(500)])
+
+    assert gateway.call(create, 10) == "answer from a"
+    assert gateway.deployments[0].requests.tokens == pytest.approx(58, abs=0.1)
+
+
+def test_hedge_returns_the_faster_deployment(sleeps, monkeypatch):
+    monkeypatch.setattr(llmGateway, "LLM_HEDGE_AFTER_SECONDS", 0.05)
+    gateway = LLMGateway("chat", ["a", "b"], 0, 0)
+    slow = threading.Event()
+    create = FakeCreate(delays={"a": slow})
+
+    try:
+        assert gateway.call(create, 10) == "answer from b"
+        assert create.calls == ["a", "b"]
+    finally:
+        slow.set()
+
+
+def test_hedge_falls_back_to_the_primary_when_the_backup_fails(sleeps, monkeypatch):
+    monkeypatch.setattr(llmGateway, "LLM_HEDGE_AFTER_SECONDS", 0.05)
+    gateway = LLMGateway("chat", ["a", "b"], 0, 0)
+    calls = []
+
+    def create(deployment):
+        calls.append(deployment)
+        if deployment == "b":
+            raise status_error(500)
+        # time.sleep is patched out by the fixture
+        threading.Event().wait(0.2)
+        return "answer from a"
+
+    assert gateway.call(create, 10) == "answer from a"
+    assert calls == ["a", "b"]
+
+
+def test_no_hedge_into_a_deployment_without_quota(sleeps, monkeypatch):
+    monkeypatch.setattr(llmGateway, "LLM_HEDGE_AFTER_SECONDS", 0.05)
+    gateway = LLMGateway("chat", ["a", "b"], 60, 0)
+    gateway.deployments[1].requests.drain()
+    slow = threading.Event()
+    threading.Timer(0.2, slow.set).start()
+    create = FakeCreate(delays={"a": slow})
+
+    assert gateway.call(create, 10) == "answer from a"
+    assert create.calls == ["a"]
+
+
+def test_async_hedge_cancels_the_loser(sleeps, monkeypatch):
+    monkeypatch.setattr(llmGateway, "LLM_HEDGE_AFTER_SECONDS", 0.05)
+    gateway = LLMGateway("chat", ["a", "b"], 0, 0)
+    cancelled = []
+
+    async def create(deployment):
+        try:
+            if deployment == "a":
+                await asyncio.sleep(5)
+            return f"answer from {deployment}"
+        except asyncio.CancelledError:
+            cancelled.append(deployment)
+            raise
+
+    async def run():
+        result = await gateway.call_async(create, 10)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "answer from b"
+    assert cancelled == ["a"]
+
+
+def embeddings_response(model, dim):
+    return SimpleNamespace(model=model, data=[SimpleNamespace(index=0, embedding=[0.0] * dim)])
+
+
+def test_embedding_deployments_must_share_a_model(monkeypatch):
+    monkeypatch.setattr(llmGateway, "_embedding_signatures", {})
+
+    llmGateway._check_embedding_deployment("a", embeddings_response("text-embedding-3-small", 1536))
+    llmGateway._check_embedding_deployment("b", embeddings_response("text-embedding-3-small", 1536))
+
+    with pytest.raises(ValueError, match="same model and dimension"):
+        llmGateway._check_embedding_deployment("c", embeddings_response("text-embedding-3-large", 3072))
+
+    # Requests for a reduced dimension are checked separately
+    llmGateway._check_embedding_deployment("a", embeddings_response("text-embedding-3-small", 256), 256)
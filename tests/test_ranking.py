@@ -0,0 +1,201 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from ranking import rank_jobs, fuse_result_lists
+
+
+def legacy_rank(results):
+    # The per-assignment loop assignmentsMatch used before ranking.py (max aggregation)
+    global_max_score = max((doc["@search.score"] for doc in results), default=1.0)
+    job_map = defaultdict(list)
+    for doc in results:
+        job_id = doc.get("gtd_id") or doc["id"].split("_")[0]
+        job_map[job_id].append(doc)
+
+    final_jobs = []
+    for job_id, chunks in job_map.items():
+        chunks.sort(key=lambda d: d["@search.score"], reverse=True)
+        top_doc = chunks[0]
+        highlighted = []
+        for doc in chunks:
+            highlights = doc.get("@search.highlights")
+            if highlights:
+                highlighted.extend(highlights.get("req_skills", []))
+                highlighted.extend(highlights.get("key_responsibilities", []))
+                highlighted.extend(highlights.get("job_desc", []))
+        final_jobs.append({
+            "id": job_id,
+            "title": top_doc.get("title", ""),
+            "matchPercent": int((top_doc["@search.score"] / global_max_score) * 100),
+            "highlightedSkills": set(highlighted),
+            "matchedChunkCount": len(chunks)
+        })
+
+    final_jobs.sort(key=lambda j: j["matchPercent"], reverse=True)
+    return final_jobs
+
+
+def chunk(job_id, index, score, highlights=None, **fields):
+    doc = {"id": f"{job_id}_{index}", "gtd_id": str(job_id), "title": f"Job {job_id}", "@search.score": score, **fields}
+    if highlights:
+        doc["@search.highlights"] = highlights
+    return doc
+
+
+def comparable(jobs):
+    return {
+        job["id"]: (job["title"], job["matchPercent"], set(job["highlightedSkills"]), job["matchedChunkCount"])
+        for job in jobs
+    }
+
+
+def test_max_matches_legacy_loop():
+    rng = random.Random(7)
+    skills = ["Python", "Azure", "SQL", "Go"]
+    results = [
+        chunk(
+            job_id, index, round(rng.uniform(0.1, 5.0), 4),
+            {"req_skills": rng.sample(skills, 2)} if rng.random() < 0.5 else None
+        )
+        for job_id in range(1, 40)
+        for index in range(rng.randint(1, 4))
+    ]
+    rng.shuffle(results)
+
+    ranked = rank_jobs(results, "max")
+
+    assert comparable(ranked) == comparable(legacy_rank([dict(doc) for doc in results]))
+    percents = [job["matchPercent"] for job in ranked]
+    assert percents == sorted(percents, reverse=True)
+
+
+def test_max_uses_the_best_chunk_for_display_fields():
+    results = [
+        chunk(1, 0, 1.0, title="low chunk"),
+        chunk(1, 1, 4.0, title="best chunk"),
+        chunk(2, 0, 2.0),
+    ]
+
+    ranked = rank_jobs(results, "max")
+
+    assert [job["id"] for job in ranked] == ["1", "2"]
+    assert ranked[0]["title"] == "best chunk"
+    assert ranked[0]["matchPercent"] == 100
+    assert ranked[1]["matchPercent"] == 50
+
+
+def test_mean_top_n_averages_each_jobs_best_chunks():
+    results = [
+        # Job 1: one strong chunk, then weak ones
+        chunk(1, 0, 10.0), chunk(1, 1, 1.0), chunk(1, 2, 1.0), chunk(1, 3, 9.0),
+        # Job 2: consistently good
+        chunk(2, 0, 8.0), chunk(2, 1, 8.0), chunk(2, 2, 8.0),
+        # Job 3: fewer chunks than top_n, averaged over what it has
+        chunk(3, 0, 6.0),
+    ]
+
+    ranked = rank_jobs(results, "mean_top_n", top_n=3)
+
+    # Job 1: (10 + 9 + 1) / 3; job 2: 8; job 3: 6
+    assert [job["id"] for job in ranked] == ["2", "1", "3"]
+    assert [job["matchPercent"] for job in ranked] == [100, 83, 75]
+    assert ranked[1]["matchedChunkCount"] == 4
+
+
+def test_rrf_without_reranker_scores():
+    # Plain vector/BM25 queries carry no @search.reranker_score
+    results = [chunk(1, 0, 3.0), chunk(2, 0, 2.0), chunk(3, 0, 1.0)]
+
+    ranked = rank_jobs(results, "rrf", rrf_k=60)
+
+    assert [job["id"] for job in ranked] == ["1", "2", "3"]
+    assert ranked[0]["matchPercent"] == 100
+    assert ranked[2]["matchPercent"] == int((1 / 63) / (1 / 61) * 100)
+
+
+def test_rrf_with_partial_reranker_scores():
+    results = [
+        chunk(1, 0, 3.0),
+        chunk(2, 0, 2.0, **{"@search.reranker_score": 3.5}),
+        chunk(3, 0, 1.0, **{"@search.reranker_score": 1.0}),
+    ]
+
+    ranked = rank_jobs(results, "rrf", rrf_k=60)
+
+    # Job 2: 1/62 + 1/61 beats job 1's 1/61 alone
+    assert [job["id"] for job in ranked] == ["2", "3", "1"]
+
+
+def test_all_zero_scores():
+    results = [chunk(1, 0, 0.0), chunk(2, 0, 0.0), chunk(2, 1, 0.0)]
+
+    for aggregation in ("max", "mean_top_n"):
+        ranked = rank_jobs(results, aggregation)
+        assert sorted(job["id"] for job in ranked) == ["1", "2"]
+        assert all(job["matchPercent"] == 0 for job in ranked)
+
+
+def test_negative_scores_clamp_to_zero():
+    # Cosine scores from the local vector index can be negative
+    results = [chunk(1, 0, 0.5), chunk(2, 0, -0.25), chunk(3, 0, -0.75)]
+
+    ranked = rank_jobs(results, "max")
+
+    assert [job["id"] for job in ranked] == ["1", "2", "3"]
+    assert [job["matchPercent"] for job in ranked] == [100, 0, 0]
+
+    ranked = rank_jobs([chunk(1, 0, -0.5), chunk(2, 0, -0.25)], "max")
+    assert all(job["matchPercent"] == 0 for job in ranked)
+
+
+def test_empty_results_and_unknown_aggregation():
+    assert rank_jobs([], "max") == []
+    with pytest.raises(ValueError):
+        rank_jobs([chunk(1, 0, 1.0)], "median")
+
+
+def test_highlights_are_merged_and_deduplicated():
+    results = [
+        chunk(1, 0, 2.0, {"req_skills": ["Python", "Azure"], "job_desc": ["Python"]}),
+        chunk(1, 1, 1.0, {"key_responsibilities": ["Azure", "Design"], "title": ["ignored"]}),
+        chunk(2, 0, 1.5),
+    ]
+
+    ranked = {job["id"]: job for job in rank_jobs(results, "max")}
+
+    assert ranked["1"]["highlightedSkills"] == ["Python", "Azure", "Design"]
+    assert ranked["2"]["highlightedSkills"] == []
+
+
+def test_job_id_falls_back_to_the_chunk_key():
+    results = [{"id": "42_0", "@search.score": 1.0}, {"id": "42_1", "@search.score": 2.0}]
+
+    ranked = rank_jobs(results, "max")
+
+    assert [(job["id"], job["matchedChunkCount"]) for job in ranked] == [("42", 2)]
+
+
+def test_fuse_result_lists():
+    bm25 = [
+        {"id": "1_0", "@search.score": 12.0, "@search.highlights": {"req_skills": ["Python"]}},
+        {"id": "2_0", "@search.score": 9.0},
+    ]
+    vector = [
+        {"id": "2_0", "@search.score": 0.9, "@search.highlights": {"req_skills": ["ignored"]}},
+        {"id": "3_0", "@search.score": 0.8},
+        {"id": "1_0", "@search.score": 0.7},
+    ]
+
+    fused = fuse_result_lists([bm25, vector], k=60)
+
+    assert [doc["id"] for doc in fused] == ["2_0", "1_0", "3_0"]
+    assert fused[0]["@search.score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1]["@search.score"] == pytest.approx(1 / 61 + 1 / 63)
+    assert fused[2]["@search.score"] == pytest.approx(1 / 62)
+    # The first list's highlights are kept; a later list only fills them in when missing
+    assert fused[1]["@search.highlights"] == {"req_skills": ["Python"]}
+    assert fused[0]["@search.highlights"] == {"req_skills": ["ignored"]}
+    # Inputs are not modified
+    assert bm25[0]["@search.score"] == 12.0
@@ -0,0 +1,137 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+import resumeLocator
+from benchmarks.fakes import FakeBlobClient, FakeBlobServiceClient
+from resumeLocator import (
+    get_latest_resume_from_folder, read_latest_resume, write_latest_resume_pointer, POINTER_WRITE_ATTEMPTS
+)
+
+CONTAINER = "gtfydemo"
+POINTER = "manifests/resume_latest.json"
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def svc(monkeypatch):
+    monkeypatch.setattr(resumeLocator, "_pointer_cache", {})
+    return FakeBlobServiceClient()
+
+
+def upload(svc, name):
+    return svc.get_blob_client(CONTAINER, name).upload_blob(b"resume", overwrite=True)
+
+
+def pointer(svc):
+    return json.loads(svc.get_blob_client(CONTAINER, POINTER).download_blob().readall())
+
+
+def race_pointer_uploads(monkeypatch, svc, blob_name, last_modified, times=1):
+    # Another instance writes the pointer between our read and our conditional upload
+    original = FakeBlobClient.upload_blob
+    raced = []
+
+    def upload_blob(self, data, **kwargs):
+        if self.blob_name == POINTER and len(raced) < times:
+            raced.append(blob_name)
+            original(self, resumeLocator._pointer_payload(blob_name, last_modified), overwrite=True)
+        return original(self, data, **kwargs)
+
+    monkeypatch.setattr(FakeBlobClient, "upload_blob", upload_blob)
+    return raced
+
+
+def test_older_write_keeps_the_newer_pointer(svc):
+    assert write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/b.pdf", T0 + timedelta(seconds=2)) == "resume/b.pdf"
+    # The upload that finished first reaches the pointer last
+    assert write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/a.pdf", T0 + timedelta(seconds=1)) == "resume/b.pdf"
+
+    assert pointer(svc)["blob_name"] == "resume/b.pdf"
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume") == "resume/b.pdf"
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_conflicting_older_write_is_retried_and_replaced(svc, monkeypatch, existing):
+    if existing:
+        write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/old.pdf", T0)
+    raced = race_pointer_uploads(monkeypatch, svc, "resume/a.pdf", T0 + timedelta(seconds=1))
+
+    result = write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/b.pdf", T0 + timedelta(seconds=2))
+
+    assert raced == ["resume/a.pdf"]
+    assert result == "resume/b.pdf"
+    assert pointer(svc)["blob_name"] == "resume/b.pdf"
+
+
+def test_conflicting_newer_write_wins(svc, monkeypatch):
+    write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/old.pdf", T0)
+    race_pointer_uploads(monkeypatch, svc, "resume/c.pdf", T0 + timedelta(seconds=3))
+
+    result = write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/b.pdf", T0 + timedelta(seconds=2))
+
+    assert result == "resume/c.pdf"
+    assert pointer(svc)["blob_name"] == "resume/c.pdf"
+
+
+def test_gives_up_when_the_pointer_keeps_changing(svc, monkeypatch):
+    write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/old.pdf", T0)
+    race_pointer_uploads(monkeypatch, svc, "resume/a.pdf", T0, times=POINTER_WRITE_ATTEMPTS)
+
+    with pytest.raises(RuntimeError):
+        write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/b.pdf", T0 + timedelta(seconds=2))
+
+
+def test_missing_pointer_is_rebuilt_from_a_listing(svc):
+    upload(svc, "resume/a.pdf")
+    upload(svc, "resume/b.pdf")
+
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume/") == "resume/b.pdf"
+    assert pointer(svc)["blob_name"] == "resume/b.pdf"
+
+
+def test_pointer_changes_are_picked_up_past_the_cached_etag(svc):
+    write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/a.pdf", T0)
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume") == "resume/a.pdf"
+    # Unchanged pointer: served from the cached name on a 304
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume") == "resume/a.pdf"
+
+    svc.get_blob_client(CONTAINER, POINTER).upload_blob(
+        resumeLocator._pointer_payload("resume/b.pdf", T0 + timedelta(seconds=1)), overwrite=True
+    )
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume") == "resume/b.pdf"
+
+
+def test_pointer_to_a_deleted_blob_is_repaired_after_a_404(svc):
+    upload(svc, "resume/a.pdf")
+    upload(svc, "resume/b.pdf")
+    # The pointer names a newer blob that has since been cleaned up
+    write_latest_resume_pointer(svc, CONTAINER, "resume", "resume/gone.pdf", T0 + timedelta(days=365 * 100))
+    reads = []
+
+    def read(blob_name):
+        reads.append(blob_name)
+        return svc.get_blob_client(CONTAINER, blob_name).download_blob().readall()
+
+    assert read_latest_resume(svc, CONTAINER, "resume", read) == ("resume/b.pdf", b"resume")
+
+    assert reads == ["resume/gone.pdf", "resume/b.pdf"]
+    assert pointer(svc)["blob_name"] == "resume/b.pdf"
+    assert get_latest_resume_from_folder(svc, CONTAINER, "resume") == "resume/b.pdf"
+
+
+def test_empty_folder_raises(svc):
+    with pytest.raises(FileNotFoundError):
+        read_latest_resume(svc, CONTAINER, "resume", lambda name: None)
+
+    svc.get_blob_client(CONTAINER, POINTER).upload_blob(
+        resumeLocator._pointer_payload("resume/gone.pdf", T0), overwrite=True
+    )
+
+    def read(blob_name):
+        raise ResourceNotFoundError("gone")
+
+    with pytest.raises(FileNotFoundError):
+        read_latest_resume(svc, CONTAINER, "resume", read)
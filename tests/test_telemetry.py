@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+from telemetry import RequestTelemetry, _current, sdk_retry_hook
+
+
+def test_sdk_retry_hook_counts_attempts_after_the_first():
+    telemetry = RequestTelemetry("route")
+    token = _current.set(telemetry)
+    try:
+        hook = sdk_retry_hook("blob")
+        # The SDK retry loop re-sends the same request, sharing its pipeline context
+        first_operation = SimpleNamespace(context={})
+        for _ in range(3):
+            hook(first_operation)
+        # A new operation starts counting again
+        hook(SimpleNamespace(context={}))
+    finally:
+        _current.reset(token)
+
+    assert telemetry.retries == {"blob": 2}
@@ -0,0 +1,215 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from clientPool import get_document_intelligence_client, get_async_document_intelligence_client
+from telemetry import traced
+
+# One extraction path for every route: the format is sniffed from the bytes, the
+# cheap local parser is used when it yields real text, and only scanned or
+# unknown documents go to the remote Document Intelligence layout model.
+SCANNED_PDF_MIN_CHARS_PER_PAGE = int(os.getenv("SCANNED_PDF_MIN_CHARS_PER_PAGE", "100"))
+PARALLEL_PDF_MIN_PAGES = int(os.getenv("PARALLEL_PDF_MIN_PAGES", "16"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def sniff_format(data, filename=None):
+    head = bytes(data[:8])
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+        return "unknown"
+    if head.startswith((b"\x89PNG", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*")):
+        return "image"
+
+    try:
+        bytes(data[:4096]).decode("utf-8")
+        return "txt"
+    except UnicodeDecodeError:
+        pass
+
+    # Last resort: trust the extension
+    ext = os.path.splitext(filename or "")[-1].lower().lstrip(".")
+    return ext if ext in ("pdf", "docx", "txt") else "unknown"
+
+
+def _pdf_page_range_text(data, start, stop):
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # fork from the multi-threaded worker (gRPC, handler threads) can copy held locks
+                # into the child and deadlock it; workers start from a clean process instead
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(start_method))
+    return _pdf_pool
+
+
+def _extract_pdf(data):
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_PDF_MIN_PAGES or PDF_WORKERS < 2:
+            pages = [page.get_text() for page in doc]
+        else:
+            pages = None
+
+    if pages is None:
+        # Long documents: contiguous page ranges parsed in parallel processes
+        step = -(-page_count // PDF_WORKERS)
+        futures = [
+            _get_pdf_pool().submit(_pdf_page_range_text, bytes(data), start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        pages = [text for future in futures for text in future.result()]
+
+    chars = sum(len(text.strip()) for text in pages)
+    if page_count and chars / page_count < SCANNED_PDF_MIN_CHARS_PER_PAGE:
+        logging.info(f"PDF has {chars} characters over {page_count} pages; treating it as scanned.")
+        return None
+
+    return "\n".join(pages)
+
+
+def _extract_docx(data):
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    doc = Document(io.BytesIO(data))
+    lines = []
+
+    # Body order, so table text lands where it appears instead of after all paragraphs
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn("w:p"):
+            lines.append(Paragraph(child, doc).text)
+        elif child.tag == qn("w:tbl"):
+            for row in Table(child, doc).rows:
+                seen = set()
+                cells = []
+                for cell in row.cells:
+                    # Merged cells are returned once per grid column
+                    if id(cell._tc) in seen:
+                        continue
+                    seen.add(id(cell._tc))
+                    text = cell.text.strip()
+                    if text:
+                        cells.append(text)
+                if cells:
+                    lines.append(" | ".join(cells))
+
+    return "\n".join(lines)
+
+
+def _extract_txt(data):
+    try:
+        return bytes(data).decode("utf-8")
+    except UnicodeDecodeError:
+        return bytes(data).decode("latin-1")
+
+
+def extract_text_locally(data, filename=None):
+    # Returns None when the document needs the layout model
+    file_format = sniff_format(data, filename)
+
+    if file_format == "pdf":
+        return _extract_pdf(data)
+    if file_format == "docx":
+        return _extract_docx(data)
+    if file_format == "txt":
+        return _extract_txt(data)
+    return None
+
+
+def layout_result_to_text(result) -> str:
+    lines = []
+
+    for page in result.pages:
+        if page.lines:
+            for line in page.lines:
+                text = line.content.strip()
+                if text:
+                    lines.append(text)
+
+    if result.tables:
+        for table in result.tables:
+            for cell in table.cells:
+                text = cell.content.strip()
+                if text:
+                    lines.append(text)
+
+    full_text = "\n".join(lines)
+    return full_text
+
+
+@traced("extract.layout")
+def extract_text_with_layout_model(data) -> str:
+    from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
+
+    client = get_document_intelligence_client()
+
+    poller = client.begin_analyze_document(
+        model_id="prebuilt-layout",
+        body=AnalyzeDocumentRequest(bytes_source=bytes(data)),
+        content_type="application/json"
+    )
+
+    return layout_result_to_text(poller.result())
+
+
+@traced("extract.layout")
+async def extract_text_with_layout_model_async(data) -> str:
+    from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
+
+    client = get_async_document_intelligence_client()
+
+    poller = await client.begin_analyze_document(
+        model_id="prebuilt-layout",
+        body=AnalyzeDocumentRequest(bytes_source=bytes(data)),
+        content_type="application/json"
+    )
+
+    return layout_result_to_text(await poller.result())
+
+
+@traced("extract")
+def extract_text(data, filename=None) -> str:
+    text = extract_text_locally(data, filename)
+    if text is not None:
+        return text
+
+    logging.info(f"Using the layout model for {filename or 'document'}")
+    return extract_text_with_layout_model(data)
+
+
+@traced("extract")
+async def extract_text_async(data, filename=None) -> str:
+    import asyncio
+
+    text = await asyncio.to_thread(extract_text_locally, data, filename)
+    if text is not None:
+        return text
+
+    logging.info(f"Using the layout model for {filename or 'document'}")
+    return await extract_text_with_layout_model_async(data)
@@ -1,47 +1,111 @@
 import azure.functions as func
 import logging
-from azure.storage.blob import BlobServiceClient
 import os
+import json
+from datetime import datetime
+
+from clientPool import get_blob_service_client, BLOB_TRANSFER_CONCURRENCY
+from resumeLocator import write_latest_resume_pointer
+from telemetry import instrument_route, span, traced
 
 uploadToBlobStorage = func.Blueprint()
 
-# Set via environment variable or directly here
-BLOB_CONNECTION_STRING = os.getenv("AZURE_BLOB_CONN")
+# Container and folder the resumes are uploaded to
 BLOB_CONTAINER_NAME = "gtfydemo"
 BLOB_FOLDER_PATH = "resume"  # Folder inside the container
 
+# "inline" clears old resumes inside the request, "background" hands it to the queue trigger below
+RESUME_CLEANUP_MODE = os.getenv("RESUME_CLEANUP_MODE", "inline")
+RESUME_CLEANUP_QUEUE = "resume-cleanup"
+
+# Blob batch API limit
+BLOB_BATCH_MAX_SIZE = 256
+
+
+@traced("blob.cleanup")
+def delete_stale_resumes(container_client, keep_blob, uploaded_before):
+    # Only blobs older than the kept upload are removed, so a late cleanup
+    # never deletes a resume uploaded after the one that scheduled it.
+    prefix = f"{BLOB_FOLDER_PATH}/"
+    stale = [
+        blob.name for blob in container_client.list_blobs(name_starts_with=prefix)
+        if blob.name != keep_blob and blob.last_modified < uploaded_before
+    ]
+
+    for i in range(0, len(stale), BLOB_BATCH_MAX_SIZE):
+        batch = stale[i:i + BLOB_BATCH_MAX_SIZE]
+        for response in container_client.delete_blobs(*batch, raise_on_any_failure=False):
+            if response.status_code not in (202, 404):
+                logging.warning(f"Failed to delete blob {response.request.url}: HTTP {response.status_code}")
+
+    logging.info(f"Deleted {len(stale)} existing blobs in {BLOB_BATCH_MAX_SIZE}-blob batches")
+    return len(stale)
+
+
 @uploadToBlobStorage.route(route="uploadToBlobStorage", methods=["POST"])
-def uploadFilesToBlobStorage(req: func.HttpRequest) -> func.HttpResponse:
+@uploadToBlobStorage.queue_output(arg_name="cleanup", queue_name=RESUME_CLEANUP_QUEUE, connection="AzureWebJobsStorage")
+@instrument_route("uploadFilesToBlobStorage")
+def uploadFilesToBlobStorage(req: func.HttpRequest, cleanup: func.Out[str]) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request for file upload.')
+    from azure.storage.blob import ContentSettings
 
     try:
         file = req.files.get('file')
         if not file:
             return func.HttpResponse("No file uploaded in the 'file' field.", status_code=400)
 
+        cleanup_mode = req.params.get('cleanup', RESUME_CLEANUP_MODE)
+        if cleanup_mode not in ("inline", "background"):
+            return func.HttpResponse("cleanup must be 'inline' or 'background'.", status_code=400)
+
         file_name = file.filename
-        file_content = file.stream.read()
         blob_path = f"{BLOB_FOLDER_PATH}/{file_name}"
 
-        # Connect to Blob Storage
-        blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+        # Shared Blob Storage client
+        blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client(BLOB_CONTAINER_NAME)
 
-        # Delete existing files in the folder
-        prefix = f"{BLOB_FOLDER_PATH}/"
-        for blob in container_client.list_blobs(name_starts_with=prefix):
-            container_client.delete_blob(blob.name)
-            logging.info(f"Deleted existing blob: {blob.name}")
-
-        # Upload new file
+        # Upload new file straight from the request stream; large files are
+        # staged as blocks in parallel instead of being read into one buffer first
         blob_client = container_client.get_blob_client(blob=blob_path)
-        blob_client.upload_blob(file_content, overwrite=True)
+        with span("blob.upload"):
+            upload_result = blob_client.upload_blob(
+                file.stream,
+                overwrite=True,
+                max_concurrency=BLOB_TRANSFER_CONCURRENCY,
+                content_settings=ContentSettings(content_type=file.content_type) if file.content_type else None
+            )
+
+        # Point the latest-resume lookup at the new file
+        write_latest_resume_pointer(
+            blob_service_client, BLOB_CONTAINER_NAME, BLOB_FOLDER_PATH, blob_path, upload_result["last_modified"]
+        )
+
+        # Delete the other files in the folder
+        if cleanup_mode == "background":
+            cleanup.set(json.dumps({
+                "keep_blob": blob_path,
+                "uploaded_at": upload_result["last_modified"].isoformat()
+            }))
+            message = "old files will be cleared in the background"
+        else:
+            delete_stale_resumes(container_client, blob_path, upload_result["last_modified"])
+            message = "after clearing old files"
 
         return func.HttpResponse(
-            f"File '{file_name}' uploaded successfully to folder '{BLOB_FOLDER_PATH}' in Blob Storage (after clearing old files).",
+            f"File '{file_name}' uploaded successfully to folder '{BLOB_FOLDER_PATH}' in Blob Storage ({message}).",
             status_code=200
         )
 
     except Exception as e:
         logging.error(f"Error uploading file: {str(e)}")
         return func.HttpResponse(f"Error uploading file: {str(e)}", status_code=500)
+
+
+@uploadToBlobStorage.queue_trigger(arg_name="msg", queue_name=RESUME_CLEANUP_QUEUE, connection="AzureWebJobsStorage")
+def cleanupResumeFolder(msg: func.QueueMessage) -> None:
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"Clearing resumes older than {payload['keep_blob']}")
+
+    container_client = get_blob_service_client().get_container_client(BLOB_CONTAINER_NAME)
+    delete_stale_resumes(container_client, payload["keep_blob"], datetime.fromisoformat(payload["uploaded_at"]))